@@ -1,8 +1,11 @@
+import asyncio
 import os
 import firebase_admin
 from firebase_admin import auth as fb_auth, credentials
 from fastapi import Header, HTTPException, Depends
 from .firestore import db
+from .config import settings
+from .resilience import READ, read
 
 # 🔹 Инициализация Firebase (для Render или локально)
 if not firebase_admin._apps:
@@ -11,8 +14,12 @@ if not firebase_admin._apps:
         if os.path.exists("/etc/secrets/service_account.json")
         else "service_account.json"
     )
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
+    if os.environ.get("FIREBASE_AUTH_EMULATOR_HOST") and not os.path.exists(cred_path):
+        # Эмулятор Auth/Firestore: ключ сервисного аккаунта не нужен
+        firebase_admin.initialize_app(options={"projectId": settings.FIREBASE_PROJECT_ID})
+    else:
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
 
 
 # 🔹 Создание Firebase-пользователя (используется в /users/create-full)
@@ -46,20 +53,27 @@ async def get_user(authorization: str | None = Header(None)):
 
     email_lower = email.strip().lower()
 
-    # 🔹 Ищем пользователя в Firestore
-    users_ref = db.collection("users")
-    q = users_ref.where("username", "==", email_lower).limit(1).stream()
-    user_doc = next(q, None)
+    # 🔹 Ищем пользователя в Firestore. Без устаревших данных: удалённый или
+    # пониженный пользователь не должен сохранять роль, пока Firestore лежит — тогда 503
+    def lookup():
+        users_ref = db.collection("users")
+        q = users_ref.where("username", "==", email_lower).limit(1).stream(**READ)
+        user_doc = next(q, None)
 
-    if not user_doc:
-        # fallback — по UID
-        q2 = users_ref.where("username", "==", decoded.get("uid")).limit(1).stream()
-        user_doc = next(q2, None)
+        if not user_doc:
+            # fallback — по UID
+            q2 = users_ref.where("username", "==", decoded.get("uid")).limit(1).stream(**READ)
+            user_doc = next(q2, None)
 
-    if not user_doc:
+        return (user_doc.to_dict() or {}) if user_doc else None
+
+    # в потоке: read() ждёт Firestore и спит между повторами — event loop не блокируем
+    user_data = await asyncio.to_thread(
+        read, ("users", "auth", email_lower, decoded.get("uid")), lookup, stale=False,
+    )
+    if user_data is None:
         raise HTTPException(status_code=403, detail=f"User '{email_lower}' not found in Firestore")
 
-    user_data = user_doc.to_dict() or {}
     role = user_data.get("role")
     if not role:
         raise HTTPException(status_code=403, detail="User role not set")
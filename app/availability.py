@@ -0,0 +1,200 @@
+"""
+Индекс занятости монтажников.
+
+Для каждого монтажника хранится битовая маска дней (бит N — день BASE + N),
+собранная из его назначений. Свободен ли человек в диапазоне — это AND
+маски с маской диапазона, нагрузка — количество единичных бит.
+
+Повторяющиеся серии в маску не попадают (они могут быть бесконечными):
+их вхождения разворачиваются только внутри запрошенного диапазона.
+
+Индекс живёт в памяти процесса, строится при первом запросе и
+поддерживается хуками записи в коллекцию assignments.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from . import hooks, recurrence
+from .firestore import db
+
+BASE = date(2020, 1, 1)
+
+# Окно вокруг запрошенного диапазона, по которому считаем нагрузку
+LOAD_WINDOW_DAYS = 30
+
+
+def day_index(d: Optional[str]) -> Optional[int]:
+    """YYYY-MM-DD → номер дня от BASE (None, если дата некорректна)"""
+    if not d:
+        return None
+    try:
+        return date.fromisoformat(d.split("T")[0]).toordinal() - BASE.toordinal()
+    except ValueError:
+        return None
+
+
+def day_str(i: int) -> str:
+    return (BASE + timedelta(days=i)).isoformat()
+
+
+def range_mask(start: int, end: int) -> int:
+    """Маска дней [start, end] включительно; дни до BASE отбрасываются"""
+    start = max(start, 0)
+    if end < start:
+        return 0
+    return ((1 << (end - start + 1)) - 1) << start
+
+
+def _span(data: dict) -> tuple[tuple[str, ...], int]:
+    """Работники и маска дней одного назначения (для серии — пустая)"""
+    workers = tuple(w for w in (data.get("workerIds") or []) if w)
+    if recurrence.is_recurring(data):
+        return workers, 0
+    start = day_index(data.get("dateStart"))
+    end = day_index(data.get("dateEnd")) if data.get("dateEnd") else start
+    if start is None or end is None:
+        return workers, 0
+    return workers, range_mask(start, end)
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._ready = False
+        self._docs: dict[str, dict] = {}
+        self._spans: dict[str, tuple[tuple[str, ...], int]] = {}
+        self._by_worker: dict[str, set[str]] = defaultdict(set)
+        self._bits: dict[str, int] = {}
+        self._series: dict[str, list[str]] = {}
+        self._backlog: Optional[list[tuple]] = None  # хуки, пришедшие во время построения
+
+    # ---------- построение ----------
+
+    def rebuild(self, docs: Iterable[tuple[str, dict]]) -> None:
+        """Строит индекс в отдельном объекте без блокировки, под _lock только подменяет"""
+        fresh = AvailabilityIndex()
+        for aid, data in docs:
+            fresh._put(aid, data)
+        for w in list(fresh._by_worker):
+            fresh._recompute(w)
+        with self._lock:
+            self._docs, self._spans, self._by_worker = fresh._docs, fresh._spans, fresh._by_worker
+            self._bits, self._series = fresh._bits, fresh._series
+            # записи во время построения могли не попасть в поток — применяем поверх
+            for event in self._backlog or ():
+                self._apply(*event)
+            self._backlog = None
+            self._ready = True
+
+    def ensure_built(self) -> None:
+        if self._ready:
+            return
+        with self._build_lock:
+            if self._ready:
+                return
+            with self._lock:
+                self._backlog = []
+            try:
+                self.rebuild((d.id, d.to_dict() or {}) for d in db.collection("assignments").stream())
+            finally:
+                with self._lock:
+                    self._backlog = None
+
+    # ---------- инкрементальные изменения ----------
+
+    def _put(self, aid: str, data: dict) -> set[str]:
+        """Сохраняет назначение; возвращает затронутых работников"""
+        touched = set(self._spans.get(aid, ((), 0))[0])
+        doc = {
+            "workerIds": data.get("workerIds") or [],
+            "dateStart": data.get("dateStart"),
+            "dateEnd": data.get("dateEnd"),
+            "recurrence": data.get("recurrence"),
+            "exdates": data.get("exdates") or [],
+        }
+        workers, mask = _span(doc)
+        self._docs[aid] = doc
+        self._spans[aid] = (workers, mask)
+        for w in touched - set(workers):
+            self._by_worker[w].discard(aid)
+        for w in workers:
+            self._by_worker[w].add(aid)
+        return touched | set(workers)
+
+    def _recompute(self, worker: str) -> None:
+        bits = 0
+        series = []
+        for aid in self._by_worker.get(worker, ()):
+            bits |= self._spans[aid][1]
+            if recurrence.is_recurring(self._docs[aid]):
+                series.append(aid)
+        if bits:
+            self._bits[worker] = bits
+        else:
+            self._bits.pop(worker, None)
+        if series:
+            self._series[worker] = series
+        else:
+            self._series.pop(worker, None)
+        if not bits and not series:
+            self._by_worker.pop(worker, None)
+
+    def on_write(self, op: str, aid: str, data: Optional[dict]) -> None:
+        with self._lock:
+            # до первого построения всё равно прочитаем коллекцию целиком
+            if self._backlog is not None:
+                self._backlog.append((op, aid, data))
+            elif self._ready:
+                self._apply(op, aid, data)
+
+    def _apply(self, op: str, aid: str, data: Optional[dict]) -> None:
+        if op == "delete":
+            touched = self._remove(aid)
+        elif op == "update":
+            touched = self._put(aid, {**self._docs.get(aid, {}), **(data or {})})
+        else:
+            touched = self._put(aid, data or {})
+        for w in touched:
+            self._recompute(w)
+
+    def _remove(self, aid: str) -> set[str]:
+        self._docs.pop(aid, None)
+        workers, _ = self._spans.pop(aid, ((), 0))
+        for w in workers:
+            self._by_worker[w].discard(aid)
+        return set(workers)
+
+    # ---------- запросы ----------
+
+    def busy(self, worker: str, start: int, end: int) -> int:
+        """Маска занятых дней работника в диапазоне"""
+        window = range_mask(start, end)
+        mask = self._bits.get(worker, 0) & window
+        for aid in self._series.get(worker, ()):
+            doc = self._docs.get(aid)
+            if not doc or not doc.get("dateStart"):
+                continue
+            for s, e in recurrence.expand(doc, day_str(max(start, 0)), day_str(end)):
+                mask |= range_mask(day_index(s.isoformat()), day_index(e.isoformat())) & window
+        return mask
+
+    def load(self, worker: str, start: int, end: int) -> int:
+        """Нагрузка: число занятых дней в диапазоне, расширенном на LOAD_WINDOW_DAYS"""
+        return self.busy(worker, start - LOAD_WINDOW_DAYS, end + LOAD_WINDOW_DAYS).bit_count()
+
+
+def mask_days(mask: int) -> list[str]:
+    """Раскладывает маску на список дат"""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(day_str(low.bit_length() - 1))
+        mask ^= low
+    return out
+
+
+index = AvailabilityIndex()
+hooks.subscribe("assignments", index.on_write)
@@ -0,0 +1,306 @@
+"""
+Резервная копия Firestore в сжатый NDJSON и восстановление из неё.
+
+Выгрузка: каждая коллекция делится на партиции (get_partitions →
+запросы с курсорами по __name__), партиции читаются .stream() параллельно
+в пуле потоков и пишутся построчно в свои part-файлы .ndjson.gz — в памяти
+не больше одного документа на поток. manifest.json пишется последним:
+копия без него считается незавершённой.
+
+Восстановление: пакетами по BATCH_SIZE записей (WriteBatch), с ограничением
+скорости (старт RESTORE_RATE док/с, +50% каждые 5 минут, как советует
+Firestore для «холодных» коллекций). После каждого пакета в restore.json
+запоминается, сколько строк part-файла уже записано, — прерванное
+восстановление продолжается с того же места. В конце сверяются счётчики
+дашборда (counters.reconcile).
+
+Копия прода в эмулятор для нагрузочного тестирования:
+
+    python -m app.backup export /tmp/prod
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m app.backup restore /tmp/prod --rate 0
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional
+
+from google.cloud import firestore
+
+from . import counters, hooks
+from .config import settings
+from .firestore import db
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+COLLECTIONS = ("users", "projects", "assignments", "statuses", "sections", "requests", "notifications")
+
+# Лимит Firestore на один batch
+BATCH_SIZE = 500
+MANIFEST = "manifest.json"
+CHECKPOINT = "restore.json"
+
+# Рост скорости записи при восстановлении: +50% каждые RAMP_SECONDS
+RAMP_SECONDS = 300
+
+
+# =====================================================
+# 🔤 Типы Firestore ↔ JSON
+# =====================================================
+def _encode(v: Any) -> Any:
+    if isinstance(v, dict):
+        return {k: _encode(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_encode(x) for x in v]
+    if isinstance(v, datetime):
+        return {"$ts": v.isoformat()}
+    if isinstance(v, bytes):
+        return {"$bytes": base64.b64encode(v).decode()}
+    if isinstance(v, firestore.GeoPoint):
+        return {"$geo": [v.latitude, v.longitude]}
+    if isinstance(v, firestore.DocumentReference):
+        return {"$ref": v.path}
+    return v
+
+
+def _decode(v: Any) -> Any:
+    if isinstance(v, list):
+        return [_decode(x) for x in v]
+    if not isinstance(v, dict):
+        return v
+    if len(v) == 1:
+        (tag, x), = v.items()
+        if tag == "$ts":
+            return datetime.fromisoformat(x)
+        if tag == "$bytes":
+            return base64.b64decode(x)
+        if tag == "$geo":
+            return firestore.GeoPoint(*x)
+        if tag == "$ref":
+            return db.document(x)
+    return {k: _decode(x) for k, x in v.items()}
+
+
+# =====================================================
+# 📤 Выгрузка
+# =====================================================
+def _partitions(name: str, count: int) -> list:
+    """Запросы-партиции коллекции; эмулятор и маленькие коллекции — одним запросом"""
+    if count > 1:
+        try:
+            return [p.query() for p in db.collection_group(name).get_partitions(count)]
+        except Exception as e:
+            log.warning("backup.partitions_failed", extra=kv(collection=name, error=str(e)))
+    return [db.collection(name)]
+
+
+def _dump(name: str, query, path: str) -> int:
+    n = 0
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+        for d in query.stream():
+            # коллекционная группа захватывает и одноимённые подколлекции
+            if d.reference.parent.parent is not None:
+                continue
+            f.write(json.dumps({"id": d.id, "data": _encode(d.to_dict() or {})}, ensure_ascii=False))
+            f.write("\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+def export(
+    dest: str,
+    collections: Iterable[str] = COLLECTIONS,
+    partitions: int = 8,
+    workers: int = 16,
+) -> dict:
+    """Параллельная выгрузка коллекций в dest/<коллекция>/part-NNNNN.ndjson.gz"""
+    started = time.monotonic()
+    os.makedirs(dest, exist_ok=True)
+    collections = list(collections)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup") as pool:
+        plans = dict(zip(collections, pool.map(lambda c: _partitions(c, partitions), collections)))
+        jobs = []
+        for name, queries in plans.items():
+            os.makedirs(os.path.join(dest, name), exist_ok=True)
+            for i, q in enumerate(queries):
+                part = os.path.join(name, f"part-{i:05d}.ndjson.gz")
+                jobs.append((name, part, pool.submit(_dump, name, q, os.path.join(dest, part))))
+
+        manifest = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "project": db.project,
+            "collections": {name: {"parts": [], "documents": 0} for name in collections},
+        }
+        for name, part, fut in jobs:
+            entry = manifest["collections"][name]
+            entry["parts"].append(part)
+            entry["documents"] += fut.result()
+
+    manifest["seconds"] = round(time.monotonic() - started, 1)
+    with open(os.path.join(dest, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    log.info("backup.exported", extra=kv(
+        dest=dest,
+        seconds=manifest["seconds"],
+        documents={k: v["documents"] for k, v in manifest["collections"].items()},
+    ))
+    return manifest
+
+
+# =====================================================
+# 📥 Восстановление
+# =====================================================
+class _Throttle:
+    """Общий для всех потоков лимит записей в секунду с плавным ростом; rate=0 — без лимита"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._next = self._started
+
+    def acquire(self, n: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate * 1.5 ** int((now - self._started) // RAMP_SECONDS)
+            at = max(self._next, now)
+            self._next = at + n / rate
+        if at > now:
+            time.sleep(at - now)
+
+
+class _Checkpoint:
+    """Сколько строк каждого part-файла уже записано"""
+
+    def __init__(self, path: str, fresh: bool):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: dict[str, int] = {}
+        if not fresh and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = json.load(f)
+
+    def mark(self, part: str, lines: int) -> None:
+        with self._lock:
+            self.done[part] = lines
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.done, f)
+            os.replace(tmp, self.path)
+
+
+def _lines(path: str, skip: int) -> Iterator[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if i >= skip and line.strip():
+                yield json.loads(line)
+
+
+def _load(src: str, name: str, part: str, throttle: _Throttle, checkpoint: _Checkpoint) -> int:
+    written = checkpoint.done.get(part, 0)
+    coll = db.collection(name)
+    pending: list[tuple[str, dict]] = []
+
+    def commit():
+        nonlocal written
+        throttle.acquire(len(pending))
+        batch = db.batch()
+        for doc_id, data in pending:
+            batch.set(coll.document(doc_id), data)
+        batch.commit()
+        written += len(pending)
+        checkpoint.mark(part, written)
+        # индексы в памяти этого процесса (при запуске из API) узнают о записи
+        for doc_id, data in pending:
+            hooks.emit(name, "set", doc_id, data)
+        pending.clear()
+
+    for doc in _lines(os.path.join(src, part), written):
+        pending.append((doc["id"], _decode(doc["data"])))
+        if len(pending) == BATCH_SIZE:
+            commit()
+    if pending:
+        commit()
+    return written
+
+
+def restore(
+    src: str,
+    collections: Optional[Iterable[str]] = None,
+    rate: Optional[float] = None,
+    workers: int = 8,
+    resume: bool = True,
+) -> dict:
+    """Восстановление копии из src; resume=False — начать заново, игнорируя restore.json"""
+    with open(os.path.join(src, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    names = [c for c in (collections or manifest["collections"]) if c in manifest["collections"]]
+    throttle = _Throttle(settings.RESTORE_RATE if rate is None else rate)
+    checkpoint = _Checkpoint(os.path.join(src, CHECKPOINT), fresh=not resume)
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="restore") as pool:
+        jobs = [
+            (name, pool.submit(_load, src, name, part, throttle, checkpoint))
+            for name in names
+            for part in manifest["collections"][name]["parts"]
+        ]
+        written: dict[str, int] = {name: 0 for name in names}
+        for name, fut in jobs:
+            written[name] += fut.result()
+
+    result = {"src": src, "documents": written, "seconds": round(time.monotonic() - started, 1)}
+    # восстановление пишет в обход счётчиков дашборда — пересчитываем их
+    if {"assignments", "requests"} & set(names):
+        result["counters"] = counters.reconcile()
+    log.info("backup.restored", extra=kv(**result))
+    return result
+
+
+# =====================================================
+# 🖥️ CLI: python -m app.backup export|restore <каталог>
+# =====================================================
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.backup", description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("export", help="выгрузить коллекции")
+    p.add_argument("dest")
+    p.add_argument("-c", "--collection", action="append", help="только эти коллекции")
+    p.add_argument("--partitions", type=int, default=8)
+    p.add_argument("--workers", type=int, default=16)
+
+    p = sub.add_parser("restore", help="восстановить из копии")
+    p.add_argument("src")
+    p.add_argument("-c", "--collection", action="append", help="только эти коллекции")
+    p.add_argument("--rate", type=float, default=None, help="записей в секунду на старте, 0 — без лимита")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--fresh", action="store_true", help="не продолжать прерванное восстановление")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "export":
+        result = export(args.dest, args.collection or COLLECTIONS, args.partitions, args.workers)
+    else:
+        result = restore(args.src, args.collection, args.rate, args.workers, resume=not args.fresh)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    from .logs import setup_logging, shutdown_logging
+
+    setup_logging()
+    try:
+        main()
+    finally:
+        shutdown_logging()
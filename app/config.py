@@ -9,5 +9,28 @@ class Settings(BaseSettings):
     SMTP_PORT: int | None = None
     SMTP_USER: str | None = None
     SMTP_PASS: str | None = None
+    # Микрокэш склеенных чтений (сек); 0 — только склейка одновременных запросов
+    READ_CACHE_TTL: float = 0.0
+    # Локальная SQLite-реплика для тяжёлых чтений (списки назначений, отчёты)
+    READ_REPLICA: bool = False
+    REPLICA_PATH: str = "/tmp/montaj-replica.sqlite3"
+    REPLICA_MAX_LAG: float = 5.0
+    # Дедлайн одного чтения Firestore, повторы и предохранитель
+    FIRESTORE_TIMEOUT: float = 5.0
+    FIRESTORE_RETRIES: int = 2
+    FIRESTORE_RETRY_BASE: float = 0.2
+    BREAKER_THRESHOLD: int = 5
+    BREAKER_RESET_SECONDS: float = 30.0
+    # Сколько секунд можно отдавать последний удачный результат, пока Firestore лежит
+    STALE_TTL_SECONDS: float = 3600.0
+    # Логи: уровень и доля отладочных событий горячего пути, которые пишем
+    LOG_LEVEL: str = "INFO"
+    LOG_SAMPLE_RATE: float = 0.01
+    # Резервные копии: каталог и стартовая скорость восстановления (записей/с, 0 — без лимита)
+    BACKUP_DIR: str = "/tmp/montaj-backups"
+    RESTORE_RATE: float = 500.0
+    # Счётчики дашборда: число шардов и период автоматической сверки (сек, 0 — выключена)
+    COUNTER_SHARDS: int = 10
+    COUNTER_RECONCILE_SECONDS: float = 0.0
 
 settings = Settings()
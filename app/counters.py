@@ -0,0 +1,204 @@
+"""
+Счётчики для дашборда, которые обновляются в момент записи.
+
+Назначения по проектам и состояниям (state) и заявки по статусам
+хранятся в шардированных документах counters/dashboard/shards/{0..N-1}:
+
+    {"assignments": {"total": 120, "in_progress": 80, ...},
+     "projects":    {"<projectId>": {"total": 12, "done_pending": 3, ...}},
+     "requests":    {"pending": 4, "approved": 17, "rejected": 2}}
+
+Роутер кладёт приращения (firestore.Increment) в тот же batch/транзакцию,
+что и саму запись, в случайный шард — так один «горячий» документ не
+упирается в лимит ~1 записи/с. Итог — сумма шардов (один get_all).
+
+Записи в обход API (консоль, клиент напрямую) счётчики не видят —
+reconcile() пересчитывает всё по коллекциям и докладывает разницу.
+"""
+import argparse
+import json
+import random
+from collections import Counter
+from typing import Optional
+
+from google.cloud import firestore
+
+from . import hooks
+from .config import settings
+from .firestore import db
+from .logs import get_logger, kv
+from .singleflight import flight
+from .resilience import READ, WRITE
+
+log = get_logger(__name__)
+
+STATES = ("in_progress", "done_pending", "done_approved", "extend_requested")
+REQUEST_STATUSES = ("pending", "approved", "rejected")
+
+Delta = Counter  # путь в документе шарда (кортеж) → приращение
+
+
+def _shards():
+    return db.collection("counters").document("dashboard").collection("shards")
+
+
+# =====================================================
+# ➕ Приращения
+# =====================================================
+def _assignment_paths(data: Optional[dict]) -> list[tuple]:
+    if not data:
+        return []
+    paths = [("assignments", "total")]
+    state = data.get("state") or "in_progress"
+    if state in STATES:
+        paths.append(("assignments", state))
+    pid = data.get("projectId")
+    if pid:
+        paths.append(("projects", pid, "total"))
+        if state in STATES:
+            paths.append(("projects", pid, state))
+    return paths
+
+
+def assignment_delta(before: Optional[dict], after: Optional[dict]) -> Delta:
+    """Изменение счётчиков при переходе назначения before → after (None — нет документа)"""
+    delta = Delta()
+    for p in _assignment_paths(before):
+        delta[p] -= 1
+    for p in _assignment_paths(after):
+        delta[p] += 1
+    return delta
+
+
+def request_delta(before: Optional[dict], after: Optional[dict]) -> Delta:
+    delta = Delta()
+    if before and before.get("status") in REQUEST_STATUSES:
+        delta[("requests", before["status"])] -= 1
+    if after and after.get("status") in REQUEST_STATUSES:
+        delta[("requests", after["status"])] += 1
+    return delta
+
+
+def combine(*deltas: Delta) -> Delta:
+    """Сумма приращений (Counter.__add__ отбрасывает отрицательные — здесь нельзя)"""
+    out = Delta()
+    for d in deltas:
+        out.update(d)
+    return out
+
+
+def _nested(delta: Delta) -> dict:
+    out: dict = {}
+    for path, n in delta.items():
+        if not n:
+            continue
+        node = out
+        for part in path[:-1]:
+            node = node.setdefault(part, {})
+        node[path[-1]] = firestore.Increment(n)
+    return out
+
+
+def apply(writer, delta: Delta) -> None:
+    """Добавляет приращения в WriteBatch или Transaction (запишутся вместе с ним)"""
+    body = _nested(delta)
+    if body:
+        shard = _shards().document(str(random.randrange(settings.COUNTER_SHARDS)))
+        writer.set(shard, body, merge=True)
+
+
+# =====================================================
+# 📊 Чтение
+# =====================================================
+def _flatten(d: dict, prefix: tuple = ()) -> Delta:
+    out = Delta()
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, prefix + (k,)))
+        elif isinstance(v, (int, float)):
+            out[prefix + (k,)] += int(v)
+    return out
+
+
+def _current() -> Delta:
+    total = Delta()
+    refs = [_shards().document(str(i)) for i in range(settings.COUNTER_SHARDS)]
+    for snap in db.get_all(refs, **READ):
+        if snap.exists:
+            total.update(_flatten(snap.to_dict() or {}))
+    return total
+
+
+def _shape(total: Delta) -> dict:
+    out = {
+        "assignments": {"total": 0, **{s: 0 for s in STATES}},
+        "projects": {},
+        "requests": {s: 0 for s in REQUEST_STATUSES},
+    }
+    for path, n in total.items():
+        if path[0] == "projects" and len(path) == 3:
+            if n:
+                out["projects"].setdefault(path[1], {"total": 0, **{s: 0 for s in STATES}})[path[2]] = n
+        elif len(path) == 2 and path[0] in out:
+            out[path[0]][path[1]] = n
+    # проекты без назначений (после удаления счётчики обнуляются, но ключи остаются)
+    out["projects"] = {pid: c for pid, c in out["projects"].items() if c["total"]}
+    return out
+
+
+def stats() -> dict:
+    return _shape(_current())
+
+
+# =====================================================
+# 🔧 Сверка с коллекциями
+# =====================================================
+def _drift() -> Delta:
+    """Разница «коллекции минус шарды»; читается не атомарно"""
+    truth = Delta()
+    for d in db.collection("assignments").select(["projectId", "state"]).stream():
+        truth.update(assignment_delta(None, d.to_dict() or {}))
+    for d in db.collection("requests").select(["status"]).stream():
+        truth.update(request_delta(None, d.to_dict() or {}))
+    current = _current()
+    return Delta({p: truth[p] - current[p] for p in set(truth) | set(current) if truth[p] != current[p]})
+
+
+def reconcile() -> dict:
+    """
+    Пересчитывает счётчики по assignments и requests и дописывает разницу приращениями.
+
+    Коллекции и шарды читаются не атомарно: запись, попавшая между чтениями,
+    выглядит как расхождение. Поэтому чиним только разницу, одинаковую
+    в двух проходах подряд; мимолётная остаётся до следующей сверки.
+    """
+    drift = _drift()
+    if drift:
+        again = _drift()
+        drift = Delta({p: n for p, n in drift.items() if again.get(p) == n})
+    if drift:
+        batch = db.batch()
+        apply(batch, drift)
+        batch.commit(**WRITE)
+        flight.invalidate("counters")
+    result = {"fixed": len(drift), "drift": {".".join(p): n for p, n in sorted(drift.items())}}
+    log.info("counters.reconciled", extra=kv(fixed=result["fixed"]))
+    return result
+
+
+# Чтения статистики идут через read(("counters",), ...) — сбрасываем их при записях
+for _collection in ("assignments", "requests"):
+    hooks.subscribe(_collection, lambda op, doc_id, data: flight.invalidate("counters"))
+
+
+if __name__ == "__main__":
+    from .logs import setup_logging, shutdown_logging
+
+    parser = argparse.ArgumentParser(prog="python -m app.counters", description="Сверка счётчиков дашборда")
+    parser.add_argument("cmd", choices=["stats", "reconcile"])
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        print(json.dumps(reconcile() if args.cmd == "reconcile" else stats(), ensure_ascii=False, indent=2))
+    finally:
+        shutdown_logging()
@@ -0,0 +1,95 @@
+"""
+Выгрузка назначений и нагрузки в CSV / XLSX.
+
+CSV отдаётся построчно генератором прямо из Firestore .stream(),
+XLSX собирается в отдельном процессе (openpyxl write_only) во временный файл.
+"""
+import asyncio
+import csv
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from .queries import iter_assignments, worker_load_rows
+
+ASSIGNMENT_COLUMNS = [
+    "id", "projectId", "sectionId", "sectionName", "statusId", "statusName",
+    "dateStart", "dateEnd", "workerIds", "workerNames", "state", "comments", "created_at",
+]
+LOAD_COLUMNS = ["worker_uid", "full_name", "days"]
+
+KINDS = ("assignments", "worker-load")
+
+
+def _cell(v):
+    if isinstance(v, (list, tuple)):
+        return ", ".join(str(i) for i in v)
+    return "" if v is None else v
+
+
+def columns(kind: str) -> list[str]:
+    return ASSIGNMENT_COLUMNS if kind == "assignments" else LOAD_COLUMNS
+
+
+def rows(kind: str, filters: dict) -> Iterator[list]:
+    """Строки выгрузки без заголовка"""
+    cols = columns(kind)
+    if kind == "assignments":
+        source: Iterable[dict] = iter_assignments(**filters)
+    else:
+        source = worker_load_rows(**filters)
+    for item in source:
+        yield [_cell(item.get(c)) for c in cols]
+
+
+def iter_csv(kind: str, filters: dict) -> Iterator[str]:
+    """CSV построчно; BOM — чтобы Excel открыл кириллицу"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush() -> str:
+        s = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return s
+
+    writer.writerow(columns(kind))
+    yield "\ufeff" + flush()
+    for row in rows(kind, filters):
+        writer.writerow(row)
+        yield flush()
+
+
+def build_xlsx(kind: str, filters: dict) -> str:
+    """Собирает XLSX во временный файл и возвращает путь (выполняется в дочернем процессе)"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=kind)
+    ws.append(columns(kind))
+    for row in rows(kind, filters):
+        ws.append(row)
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="export_")
+    os.close(fd)
+    wb.save(path)
+    return path
+
+
+# spawn, а не fork: gRPC-клиент Firestore нельзя наследовать через fork
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def build_xlsx_async(kind: str, filters: dict) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), build_xlsx, kind, filters)
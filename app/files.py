@@ -1,8 +1,10 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from google.cloud import storage
 import uuid
+from .logs import get_logger, kv
 
 router = APIRouter(prefix="/files", tags=["files"])
+log = get_logger(__name__)
 
 @router.post("/upload")
 def upload_file(file: UploadFile = File(...)):
@@ -12,4 +14,5 @@ def upload_file(file: UploadFile = File(...)):
     blob = bucket.blob(filename)
     blob.upload_from_file(file.file, content_type=file.content_type)
     url = blob.public_url
+    log.info("file.uploaded", extra=kv(path=filename, content_type=file.content_type))
     return {"url": url, "name": file.filename}
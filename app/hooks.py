@@ -0,0 +1,32 @@
+"""
+Хуки записи в Firestore.
+
+Роутеры после успешной записи вызывают emit(), а внутренние индексы
+подписываются на нужную коллекцию через subscribe().
+"""
+from collections import defaultdict
+from typing import Callable, Optional
+
+from .logs import get_logger, kv
+
+log = get_logger(__name__)
+
+# op: "set" — полный документ, "update" — только изменённые поля, "delete" — data=None
+Listener = Callable[[str, str, Optional[dict]], None]
+
+_listeners: dict[str, list[Listener]] = defaultdict(list)
+
+
+def subscribe(collection: str, fn: Listener) -> Listener:
+    """Подписывает fn(op, doc_id, data) на записи в коллекцию"""
+    _listeners[collection].append(fn)
+    return fn
+
+
+def emit(collection: str, op: str, doc_id: str, data: Optional[dict] = None) -> None:
+    """Оповещает подписчиков. Ошибка индекса не должна ломать запись."""
+    for fn in list(_listeners.get(collection, ())):
+        try:
+            fn(op, doc_id, data)
+        except Exception:
+            log.exception("hook.failed", extra=kv(collection=collection, doc_id=doc_id, op=op))
@@ -0,0 +1,77 @@
+"""
+Загрузка документов по id пачками, в пределах одного HTTP-запроса.
+
+Вместо N отдельных document(id).get() вызывающий код просит сразу все
+нужные id: load_many() забирает недостающие одним db.get_all(), а уже
+прочитанные в этом запросе документы отдаёт из памяти. Загрузчик свой
+у каждого запроса (ContextVar, ставит middleware в main), поэтому
+данные между запросами не протухают. Запись через hooks.emit() выкидывает
+документ из памяти, чтобы дальше в том же запросе читался свежий.
+
+Вне HTTP-запроса (фоновые задачи, отдельный процесс XLSX) current()
+возвращает новый загрузчик: пачки работают, кэша между вызовами нет.
+"""
+import threading
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from . import hooks
+from .firestore import db
+from .resilience import READ
+
+# Сколько ссылок отдаём в один get_all
+CHUNK = 300
+
+
+class Loader:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._memo: dict[tuple[str, str], object] = {}  # (коллекция, id) → DocumentSnapshot
+
+    def load_many(self, collection: str, ids: Iterable[str]) -> dict:
+        """id → DocumentSnapshot (у отсутствующих snap.exists == False)"""
+        ids = [i for i in dict.fromkeys(ids) if i]
+        with self._lock:
+            out = {i: self._memo[(collection, i)] for i in ids if (collection, i) in self._memo}
+        missing = [i for i in ids if i not in out]
+        coll = db.collection(collection)
+        for n in range(0, len(missing), CHUNK):
+            refs = [coll.document(i) for i in missing[n:n + CHUNK]]
+            snaps = list(db.get_all(refs, **READ))
+            with self._lock:
+                for snap in snaps:
+                    self._memo[(collection, snap.id)] = snap
+                    out[snap.id] = snap
+        return out
+
+    def load(self, collection: str, doc_id: str):
+        return self.load_many(collection, [doc_id])[doc_id]
+
+    def forget(self, collection: str, doc_id: str) -> None:
+        with self._lock:
+            self._memo.pop((collection, doc_id), None)
+
+
+_current: ContextVar[Optional[Loader]] = ContextVar("loader", default=None)
+
+
+def begin_request() -> Loader:
+    loader = Loader()
+    _current.set(loader)
+    return loader
+
+
+def current() -> Loader:
+    return _current.get() or Loader()
+
+
+def _forget(collection: str):
+    def listener(op: str, doc_id: str, data: Optional[dict]) -> None:
+        loader = _current.get()
+        if loader is not None:
+            loader.forget(collection, doc_id)
+    return listener
+
+
+for _collection in ("users", "statuses", "projects", "assignments", "sections", "requests"):
+    hooks.subscribe(_collection, _forget(_collection))
@@ -0,0 +1,164 @@
+"""
+Структурные логи в JSON.
+
+Запись в лог не блокирует обработчик запроса: QueueHandler кладёт запись
+в очередь, а форматирование (JSON, маскирование персональных данных)
+и вывод в stdout делает QueueListener в своём потоке.
+
+Каждая запись получает request_id текущего HTTP-запроса (его ставит
+middleware в main). Отладочные события на горячем пути помечаются
+kv(sampled=True, ...): ниже LOG_LEVEL они пишутся с вероятностью LOG_SAMPLE_RATE.
+
+    log = get_logger(__name__)
+    log.info("assignment.created", extra=kv(id=ref.id, projectId=...))
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from .config import settings
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Поля, значения которых не пишем вообще
+SECRET_KEYS = re.compile(r"pass|token|secret|authorization|cookie|salt|hash", re.I)
+_EMAIL_RE = re.compile(r"([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*(@[A-Za-z0-9.-]+)")
+# Телефоны: в полях phone/tel/mobile — любые цифры; в прочем тексте — только с «+»,
+# иначе под маску попадают даты (2025-03-15) и id
+PHONE_KEYS = re.compile(r"phone|tel|mobile", re.I)
+_PHONE_RE = re.compile(r"\+\d[\d\s()-]{7,}\d")
+_DIGITS_RE = re.compile(r"\d(?=(?:\D*\d){2})")
+# ФИО: оставляем только инициалы («Пётр Иванов» → «П*** И***»)
+NAME_KEYS = re.compile(r"full_?name|display_?name|worker_?names", re.I)
+
+
+def kv(sampled: bool = False, **fields: Any) -> dict:
+    """extra= для записи: поля события и признак семплирования"""
+    return {"fields": fields, "sampled": sampled}
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    rid = (incoming or "").strip()[:64] or uuid.uuid4().hex[:16]
+    request_id.set(rid)
+    return rid
+
+
+def _mask_phone(m: re.Match) -> str:
+    s = m.group(0)
+    return "*" * (len(s) - 2) + s[-2:]
+
+
+def _mask_name(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set)):
+        return [_mask_name(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(w[0] + "***" for w in value.split())
+    return value
+
+
+def redact(value: Any, key: str = "") -> Any:
+    """Маскирует пароли/токены, e-mail, телефоны и ФИО"""
+    if key and SECRET_KEYS.search(key):
+        return "***"
+    if key and NAME_KEYS.search(key):
+        return _mask_name(value)
+    if key and PHONE_KEYS.search(key) and isinstance(value, (str, int)):
+        # все цифры, кроме двух последних
+        return _DIGITS_RE.sub("*", str(value))
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return _PHONE_RE.sub(_mask_phone, _EMAIL_RE.sub(r"\1***\2", value))
+    return value
+
+
+class _Context(logging.Filter):
+    """Выполняется в потоке запроса: запоминает request_id и решает, пишем ли семплируемое"""
+
+    def __init__(self, level: int):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level:
+            if not getattr(record, "sampled", False) or random.random() >= settings.LOG_SAMPLE_RATE:
+                return False
+        record.request_id = request_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Не форматирует запись в потоке запроса — только подставляет аргументы"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            out["request_id"] = record.request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            out.update(redact(fields))
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+    level = logging.getLevelName(settings.LOG_LEVEL.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    handler.addFilter(_Context(level))
+
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter())
+
+    root = logging.getLogger("app")
+    # семплируемые события ниже уровня должны дойти до фильтра
+    root.setLevel(min(level, logging.DEBUG) if settings.LOG_SAMPLE_RATE > 0 else level)
+    root.handlers[:] = [handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
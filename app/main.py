@@ -1,6 +1,11 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from typing import Optional
+import asyncio
+import threading
+import time
 from .config import settings
 from .routers import (
     users,
@@ -11,15 +16,74 @@ from .routers import (
     requests,
     reports,
     sections,
+    search,
+    backup,
+    dashboard,
 )
 from .auth import get_user
 from .firestore import db
+from . import hooks
+from .search import index as search_index
+from .replica import replica
+from .singleflight import flight
+from . import resilience
+from .resilience import WRITE
+from . import counters
+from . import loader
+from .logs import setup_logging, shutdown_logging, get_logger, kv, new_request_id
+
+setup_logging()
+log = get_logger(__name__)
+
+# Запросы дольше этого логируем всегда, остальные — по семплированию
+SLOW_REQUEST_MS = 1000
 
 # =====================================================
 # 🚀 Инициализация приложения
 # =====================================================
 app = FastAPI(title="SistemaB API", version="1.0.0")
 
+# =====================================================
+# 🛡️ Сбои Firestore: устаревшие данные и быстрый отказ
+# =====================================================
+# Объявлен до CORS, чтобы CORS оставался внешним и добавлял заголовки и к 503
+@app.middleware("http")
+async def firestore_resilience(request: Request, call_next):
+    if (
+        request.method not in ("GET", "HEAD", "OPTIONS")
+        and resilience.breaker.state == "open"
+    ):
+        return JSONResponse({"detail": "Firestore временно недоступен"}, status_code=503)
+    state = resilience.begin_request()
+    response = await call_next(request)
+    if state["stale_age"] is not None:
+        response.headers["X-Data-Stale"] = "1"
+        response.headers["X-Data-Stale-Age"] = str(int(state["stale_age"]))
+    return response
+
+# =====================================================
+# 🧾 request_id для логов
+# =====================================================
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    rid = new_request_id(request.headers.get("X-Request-ID"))
+    loader.begin_request()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        log.exception("http.error", extra=kv(method=request.method, path=request.url.path))
+        raise
+    ms = round((time.perf_counter() - started) * 1000, 1)
+    fields = kv(method=request.method, path=request.url.path, status=response.status_code, ms=ms)
+    if response.status_code >= 500 or ms >= SLOW_REQUEST_MS:
+        log.warning("http.request", extra=fields)
+    else:
+        fields["sampled"] = True
+        log.debug("http.request", extra=fields)
+    response.headers["X-Request-ID"] = rid
+    return response
+
 # =====================================================
 # 🌍 CORS НАСТРОЙКИ
 # =====================================================
@@ -42,6 +106,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Data-Stale", "X-Data-Stale-Age", "X-Request-ID", "ETag"],
 )
 
 # =====================================================
@@ -55,6 +120,36 @@ app.include_router(assignments.router)
 app.include_router(requests.router)
 app.include_router(reports.router)
 app.include_router(sections.router)
+app.include_router(search.router)
+app.include_router(backup.router)
+app.include_router(dashboard.router)
+
+# =====================================================
+# 🔎 Прогрев индексов в памяти
+# =====================================================
+@app.on_event("startup")
+def build_indexes():
+    # в фоне, чтобы не задерживать старт; первый запрос поиска дождётся построения
+    threading.Thread(target=search_index.ensure_built, daemon=True).start()
+    if settings.READ_REPLICA:
+        replica.start()
+    if settings.COUNTER_RECONCILE_SECONDS > 0:
+        threading.Thread(target=_reconcile_counters, daemon=True).start()
+
+
+def _reconcile_counters():
+    # счётчики расходятся только из-за записей в обход API — сверяем их изредка
+    while True:
+        time.sleep(settings.COUNTER_RECONCILE_SECONDS)
+        try:
+            counters.reconcile()
+        except Exception:
+            log.exception("counters.reconcile_failed")
+
+
+@app.on_event("shutdown")
+def flush_logs():
+    shutdown_logging()
 
 # =====================================================
 # 👤 Эндпоинт текущего пользователя
@@ -65,6 +160,10 @@ async def me(current_user: dict = Depends(get_user)):
     Возвращает профиль текущего пользователя.
     Если пользователя нет в Firestore — создаёт его автоматически.
     """
+    return _profile(current_user)
+
+
+def _profile(current_user: dict) -> dict:
     uid = current_user["uid"]
     email = (current_user.get("email") or "").strip().lower()
 
@@ -83,8 +182,9 @@ async def me(current_user: dict = Depends(get_user)):
             "role": "installer",
             "created_at": datetime.utcnow().isoformat(),
         }
-        db.collection("users").document(email).set(data)
-        print(f"[AUTO] Добавлен новый пользователь Firestore: {email}")
+        db.collection("users").document(email).set(data, **WRITE)
+        hooks.emit("users", "set", email, data)
+        log.info("user.auto_created", extra=kv(email=email))
 
     return {
         "uid": uid,
@@ -93,9 +193,61 @@ async def me(current_user: dict = Depends(get_user)):
         "role": data.get("role", "Не указана"),
     }
 
+# =====================================================
+# 🚀 Всё для старта приложения одним запросом
+# =====================================================
+# Пресеты проекций для compact=true
+COMPACT_FIELDS = {
+    "projects": "summary",
+    "sections": "dropdown",
+    "workers": "dropdown",
+    "assignments": "calendar",
+}
+
+@app.get("/bootstrap")
+async def bootstrap(
+    compact: bool = Query(False, description="Только поля, нужные интерфейсу"),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    current_user: dict = Depends(get_user),
+):
+    """
+    Профиль, проекты, статусы, разделы, монтажники и назначения одним ответом.
+    Авторизация — один раз, чтения из Firestore идут параллельно.
+    Монтажник получает только свои назначения.
+    """
+    role = current_user["role"]
+    email = (current_user.get("email") or "").strip().lower()
+    fields = COMPACT_FIELDS if compact else {}
+    own = email if role in ("installer", "worker") else None
+
+    names = ["me", "projects", "statuses", "sections", "workers", "assignments"]
+    results = await asyncio.gather(
+        asyncio.to_thread(_profile, current_user),
+        asyncio.to_thread(projects.list_projects, fields=fields.get("projects")),
+        asyncio.to_thread(statuses.list_statuses),
+        asyncio.to_thread(sections.list_sections, fields=fields.get("sections")),
+        asyncio.to_thread(workers.list_workers, fields=fields.get("workers")),
+        asyncio.to_thread(
+            assignments.list_assignments,
+            date_from=date_from,
+            date_to=date_to,
+            worker_uid=own,
+            project_id=None,
+            section_id=None,
+            fields=fields.get("assignments"),
+        ),
+    )
+    return dict(zip(names, results))
+
 # =====================================================
 # 🩺 Healthcheck
 # =====================================================
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {
+        "ok": True,
+        "firestore": resilience.stats(),
+        "reads": flight.stats(),
+        "replica": replica.stats(),
+    }
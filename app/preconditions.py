@@ -0,0 +1,143 @@
+"""
+Запись без предварительного чтения.
+
+Вместо ref.get() → .exists → update()/delete() запись уходит в Firestore
+сразу, с предусловием: «документ существует» или, если клиент прислал
+If-Match, «документ не менялся с версии X» (last_update_time).
+Один запрос вместо двух и нет гонки между проверкой и записью.
+
+Версия документа — его update_time в RFC 3339; её отдаём в поле
+"version" и в заголовке ETag.
+
+    NotFound           → 404
+    FailedPrecondition → 409 (документ изменили после чтения клиентом)
+"""
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Response
+from google.api_core import exceptions as gexc
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from .firestore import db
+from .resilience import READ, WRITE
+
+
+def version(ts) -> Optional[str]:
+    """update_time снимка или результата записи → строка версии"""
+    return ts.rfc3339() if ts is not None else None
+
+
+def set_etag(response: Response, v: Optional[str]) -> None:
+    if v:
+        response.headers["ETag"] = f'"{v}"'
+
+
+def _tag(if_match: Optional[str]) -> str:
+    tag = (if_match or "").strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    return tag.strip('"')
+
+
+def _conflict() -> HTTPException:
+    return HTTPException(409, "Документ изменён другим пользователем, обновите данные")
+
+
+def check(snap, if_match: Optional[str]) -> None:
+    """Сверяет If-Match с версией уже прочитанного документа (внутри транзакции)"""
+    tag = _tag(if_match)
+    if tag and tag != "*" and tag != version(snap.update_time):
+        raise _conflict()
+
+
+def _option(if_match: Optional[str], exists: bool):
+    """
+    Без If-Match: для delete — exists=True, для update — None
+    (update и так требует существования, явный ExistsOption SDK не принимает).
+    """
+    tag = _tag(if_match)
+    if not tag or tag == "*":
+        return db.write_option(exists=True) if exists else None
+    try:
+        ts = DatetimeWithNanoseconds.from_rfc3339(tag)
+    except ValueError:
+        raise HTTPException(400, "Некорректный If-Match")
+    return db.write_option(last_update_time=ts)
+
+
+def update(ref, updates: dict, if_match: Optional[str] = None, not_found: str = "Not found") -> Optional[str]:
+    """ref.update с предусловием; возвращает новую версию"""
+    try:
+        result = ref.update(updates, option=_option(if_match, exists=False), **WRITE)
+    except gexc.NotFound:
+        raise HTTPException(404, not_found)
+    except gexc.FailedPrecondition:
+        raise _conflict()
+    return version(result.update_time)
+
+
+def current(ref, if_match: Optional[str] = None, not_found: str = "Not found") -> Optional[str]:
+    """Пустое обновление: ничего не пишем, только проверяем существование и версию"""
+    snap = ref.get(**READ)
+    if not snap.exists:
+        raise HTTPException(404, not_found)
+    check(snap, if_match)
+    return version(snap.update_time)
+
+
+# Сколько раз повторяем conditional_write, если документ изменили между чтением и записью
+CONDITIONAL_ATTEMPTS = 3
+
+
+def conditional_write(
+    ref,
+    fields: list[str],
+    write: Callable,
+    if_match: Optional[str] = None,
+    not_found: str = "Not found",
+):
+    """
+    Запись, которой нужно прежнее состояние документа (например, для счётчиков).
+
+    Читаются только fields, затем write(batch, data, option) добавляет в batch
+    запись документа с предусловием last_update_time = версия прочитанного —
+    и всё, что должно записаться вместе с ней. Дешевле транзакции (нет
+    begin_transaction) и возвращает версию после записи.
+    Документ изменили между чтением и записью: с If-Match — 409, без — повтор.
+    Возвращает (данные до записи, новая версия или None для удаления).
+    """
+    for attempt in range(CONDITIONAL_ATTEMPTS):
+        snap = ref.get(field_paths=fields, **READ)
+        if not snap.exists:
+            raise HTTPException(404, not_found)
+        check(snap, if_match)
+        data = snap.to_dict() or {}
+        batch = db.batch()
+        write(batch, data, db.write_option(last_update_time=snap.update_time))
+        try:
+            results = batch.commit(**WRITE)
+        except (gexc.FailedPrecondition, gexc.NotFound):
+            if if_match:
+                raise _conflict()
+            continue
+        return data, version(results[0].update_time) if results else None
+    raise _conflict()
+
+
+def delete(ref, if_match: Optional[str] = None, not_found: Optional[str] = None) -> bool:
+    """
+    ref.delete с предусловием; False — документа не было.
+    not_found=None — удаление идемпотентно (отсутствующий документ не ошибка),
+    но только без If-Match: версия отсутствующего документа совпасть не может.
+    """
+    try:
+        ref.delete(option=_option(if_match, exists=True), **WRITE)
+    except gexc.NotFound:
+        if not_found is None and not if_match:
+            return False
+        raise HTTPException(404, not_found or "Not found")
+    except gexc.FailedPrecondition:
+        if not_found is None and not if_match:
+            return False
+        raise _conflict()
+    return True
@@ -0,0 +1,85 @@
+"""
+Проекция полей для списков (?fields=...).
+
+Параметр — список полей и/или пресетов через запятую, например
+`fields=summary` или `fields=name,active`. Пресеты свои у каждой коллекции.
+`id` возвращается всегда. Проекция уходит в Firestore как select(),
+так что лишние поля не читаются и не сериализуются.
+"""
+import re
+from typing import Optional
+
+from fastapi import HTTPException
+
+PRESETS: dict[str, dict[str, list[str]]] = {
+    "projects": {
+        "dropdown": ["name"],
+        "summary": ["name", "active", "start_date", "end_date", "contract_start", "contract_end", "manager"],
+    },
+    "assignments": {
+        "calendar": ["projectId", "sectionId", "sectionName", "statusId", "statusName",
+                     "dateStart", "dateEnd", "workerIds", "state"],
+        "summary": ["projectId", "sectionName", "statusName", "dateStart", "dateEnd",
+                    "workerIds", "workerNames", "state"],
+    },
+    "users": {
+        "dropdown": ["full_name"],
+        "summary": ["full_name", "username", "role", "subrole"],
+    },
+    "workers": {
+        "dropdown": ["full_name", "type"],
+        "summary": ["full_name", "type", "phone", "email", "active"],
+    },
+    "sections": {
+        "dropdown": ["name"],
+        "summary": ["name", "code", "order", "active"],
+    },
+}
+
+# Возвращаются при любой проекции (occurrence — дата вхождения повторяющейся серии,
+# version — update_time документа для If-Match)
+ALWAYS = {"id", "occurrence", "version"}
+
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def parse_fields(collection: str, fields: Optional[str]) -> Optional[list[str]]:
+    """None — все поля; иначе отсортированный список полей (может быть пустым — только id)"""
+    if not fields:
+        return None
+    presets = PRESETS.get(collection, {})
+    out: set[str] = set()
+    for token in (t.strip() for t in fields.split(",")):
+        if not token or token == "id":
+            continue
+        if token in presets:
+            out.update(presets[token])
+        elif _FIELD_RE.match(token):
+            out.add(token)
+        else:
+            raise HTTPException(400, f"Некорректное поле '{token}'")
+    return sorted(out)
+
+
+def cache_key(fields: Optional[list[str]]) -> Optional[tuple[str, ...]]:
+    """Проекция как часть ключа склейки чтений: None — все поля, () — только id"""
+    return tuple(fields) if fields is not None else None
+
+
+def select(q, fields: Optional[list[str]], extra: tuple[str, ...] = ()):
+    """
+    Накладывает проекцию на запрос. extra — поля, которые нужны
+    для фильтрации в Python; их потом убирает trim().
+    """
+    if fields is None:
+        return q
+    paths = sorted(set(fields) | set(extra))
+    # пустая проекция в Firestore означает «все поля», поэтому просим только имя документа
+    return q.select(paths or ["__name__"])
+
+
+def trim(item: dict, fields: Optional[list[str]]) -> dict:
+    if fields is None:
+        return item
+    top = {f.split(".")[0] for f in fields} | ALWAYS
+    return {k: v for k, v in item.items() if k in top}
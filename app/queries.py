@@ -0,0 +1,128 @@
+"""
+Общие запросы к Firestore, которые нужны и роутерам, и фоновым задачам.
+
+Модуль не импортирует auth/роутеры, поэтому его можно грузить
+в отдельном процессе (например, при генерации XLSX).
+Если SQLite-реплика включена и свежая, чтения идут в неё.
+"""
+from datetime import date
+from typing import Iterator, Optional
+
+from .firestore import db
+from .projection import select, trim
+from .replica import replica
+from . import loader, recurrence
+
+
+def iter_assignments(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    worker_uid: Optional[str] = None,
+    project_id: Optional[str] = None,
+    section_id: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+    rpc: Optional[dict] = None,
+) -> Iterator[dict]:
+    """
+    Назначения с фильтрацией, по одному документу (через .stream()).
+    Повторяющиеся серии при заданном окне date_from..date_to разворачиваются во вхождения.
+    rpc — параметры вызова stream() (дедлайн для ответа API; выгрузке он не нужен).
+    """
+    if replica.fresh():
+        source = replica.assignments(date_from, date_to, worker_uid, project_id, section_id)
+    else:
+        q = db.collection("assignments")
+        if project_id:
+            q = q.where("projectId", "==", project_id)
+        if section_id:
+            q = q.where("sectionId", "==", section_id)
+        if worker_uid:
+            q = q.where("workerIds", "array_contains", worker_uid)
+        extra = ("dateStart", "dateEnd", "seriesEnd", "recurrence", "exdates") if date_from or date_to else ()
+        q = select(q, fields, extra=extra)
+        source = ({"id": d.id, **(d.to_dict() or {})} for d in q.stream(**(rpc or {})))
+
+    for x in source:
+        end = x.get("seriesEnd") or x.get("dateEnd", x.get("dateStart", ""))
+        if date_from and end < date_from:
+            continue
+        if date_to and x.get("dateStart", "") > date_to:
+            continue
+        if date_from and date_to and recurrence.is_recurring(x):
+            for occ in recurrence.occurrence_docs(x, date_from, date_to):
+                yield trim(occ, fields)
+        else:
+            yield trim(x, fields)
+
+
+def _overlap_days(start: str, end: str, date_from: str, date_to: str) -> int:
+    """Сколько дней назначения [start, end] попадает в [date_from, date_to]"""
+    try:
+        s = max(date.fromisoformat(start[:10]), date.fromisoformat(date_from))
+        e = min(date.fromisoformat((end or start)[:10]), date.fromisoformat(date_to))
+    except ValueError:
+        return 0
+    return max((e - s).days + 1, 0)
+
+
+def worker_load_counts(
+    date_from: str,
+    date_to: str,
+    worker_uid: Optional[str] = None,
+    project_id: Optional[str] = None,
+    section_id: Optional[str] = None,
+) -> dict[str, int]:
+    """
+    Количество рабочих дней по монтажникам за период.
+    Понимает и старые документы (date + worker_uid), и текущие (dateStart/dateEnd + workerIds).
+    """
+    agg: dict[str, int] = {}
+    if replica.fresh():
+        # обычные назначения считает SQL, серии разворачиваем здесь
+        agg = replica.worker_load_counts(date_from, date_to, worker_uid, project_id, section_id)
+        source = replica.assignments(date_from, date_to, worker_uid, project_id, section_id, recurring=True)
+    else:
+        q = db.collection("assignments")
+        if project_id:
+            q = q.where("projectId", "==", project_id)
+        if section_id:
+            q = q.where("sectionId", "==", section_id)
+        source = (d.to_dict() or {} for d in q.stream())
+
+    for x in source:
+        if recurrence.is_recurring(x):
+            if x.get("seriesEnd", "") < date_from or x.get("dateStart", "") > date_to:
+                continue
+            days = recurrence.overlap_days(x, date_from, date_to)
+            workers = x.get("workerIds") or []
+        elif x.get("dateStart"):
+            days = _overlap_days(x["dateStart"], x.get("dateEnd", ""), date_from, date_to)
+            workers = x.get("workerIds") or []
+        else:
+            days = 1 if date_from <= x.get("date", "") <= date_to else 0
+            workers = [x["worker_uid"]] if x.get("worker_uid") else []
+        if not days:
+            continue
+        for w in workers:
+            if worker_uid and w != worker_uid:
+                continue
+            agg[w] = agg.get(w, 0) + days
+    return agg
+
+
+def worker_load_rows(date_from: str, date_to: str, **filters) -> list[dict]:
+    """Нагрузка с именами монтажников, отсортированная по имени"""
+    counts = worker_load_counts(date_from, date_to, **filters)
+    if replica.fresh():
+        names = replica.user_names(list(counts))
+    else:
+        users = loader.current().load_many("users", counts)
+        names = {uid: (snap.to_dict() or {}).get("full_name", uid) for uid, snap in users.items()}
+    out = []
+    for uid, cnt in counts.items():
+        out.append({
+            "worker_uid": uid,
+            "full_name": names.get(uid, uid),
+            "days": cnt,
+        })
+    return sorted(out, key=lambda r: r["full_name"])
@@ -0,0 +1,153 @@
+"""
+Повторяющиеся назначения.
+
+В документе хранится только первое вхождение (dateStart/dateEnd задают
+длительность), правило recurrence и исключения exdates:
+
+    recurrence = {"freq": "daily" | "weekly", "interval": N,
+                  "byweekday": [0..6], "until": "YYYY-MM-DD", "count": N}
+
+Вхождения разворачиваются лениво и только внутри запрошенного окна:
+первое подходящее вхождение находится арифметикой, без перебора
+предыдущих, поэтому чтение серии не зависит от её длины.
+"""
+from datetime import date, timedelta
+from typing import Iterator
+
+# Для бесконечной серии в seriesEnd пишем «никогда»
+OPEN_END = "9999-12-31"
+
+
+def is_recurring(doc: dict) -> bool:
+    return bool(doc.get("recurrence"))
+
+
+def _d(s: str) -> date:
+    return date.fromisoformat(s[:10])
+
+
+def _starts(first: date, rule: dict, lo: date, hi: date) -> Iterator[tuple[int, date]]:
+    """(порядковый номер, дата начала) вхождений с началом в [lo, hi]"""
+    interval = max(int(rule.get("interval") or 1), 1)
+    until = _d(rule["until"]) if rule.get("until") else None
+    count = rule.get("count")
+    if until and until < hi:
+        hi = until
+    lo = max(lo, first)
+    if hi < lo:
+        return
+
+    if rule.get("freq") == "daily":
+        k = -(-(lo - first).days // interval)
+        d = first + timedelta(days=k * interval)
+        while d <= hi and (count is None or k < count):
+            yield k, d
+            k += 1
+            d += timedelta(days=interval)
+        return
+
+    # weekly: недели с шагом interval, в каждой — дни byweekday (0 = пн)
+    days = sorted({int(w) % 7 for w in (rule.get("byweekday") or [first.weekday()])})
+    week0 = first - timedelta(days=first.weekday())
+    head = sum(1 for w in days if w >= first.weekday())  # вхождений в первой неделе
+    j = max((lo - week0).days // 7 // interval, 0)
+    while True:
+        monday = week0 + timedelta(weeks=j * interval)
+        if monday > hi:
+            return
+        k = 0 if j == 0 else head + (j - 1) * len(days)
+        for w in days:
+            d = monday + timedelta(days=w)
+            if d < first:
+                continue
+            if count is not None and k >= count:
+                return
+            if lo <= d <= hi:
+                yield k, d
+            k += 1
+        j += 1
+
+
+def expand(doc: dict, win_from: str, win_to: str) -> Iterator[tuple[date, date]]:
+    """(начало, конец) вхождений серии, пересекающихся с окном [win_from, win_to]"""
+    first = _d(doc["dateStart"])
+    duration = timedelta(days=(_d(doc.get("dateEnd") or doc["dateStart"]) - first).days)
+    skip = {x[:10] for x in doc.get("exdates") or []}
+    lo, hi = _d(win_from) - duration, _d(win_to)
+    for _, start in _starts(first, doc["recurrence"], lo, hi):
+        if start.isoformat() not in skip:
+            yield start, start + duration
+
+
+def _last_start(first: date, rule: dict, hi: date) -> date | None:
+    """Дата начала последнего вхождения не позже hi — арифметикой, как и в _starts"""
+    interval = max(int(rule.get("interval") or 1), 1)
+    count = rule.get("count")
+    if hi < first:
+        return None
+
+    if rule.get("freq") == "daily":
+        k = (hi - first).days // interval
+        if count is not None:
+            k = min(k, int(count) - 1)
+        return first + timedelta(days=k * interval)
+
+    days = sorted({int(w) % 7 for w in (rule.get("byweekday") or [first.weekday()])})
+    week0 = first - timedelta(days=first.weekday())
+    head = [w for w in days if w >= first.weekday()]  # дни первой недели
+
+    # последнее вхождение не позже hi: в неделе с hi или в предыдущей активной
+    j = (hi - week0).days // 7 // interval
+    monday = week0 + timedelta(weeks=j * interval)
+    fit = [w for w in (head if j == 0 else days) if w <= (hi - monday).days]
+    if fit:
+        last = monday + timedelta(days=fit[-1])
+    elif j == 0:
+        return None
+    else:
+        last = monday - timedelta(weeks=interval) + timedelta(days=days[-1])
+
+    # вхождение номер count - 1
+    if count is not None:
+        k = int(count) - 1
+        if k < len(head):
+            by_count = week0 + timedelta(days=head[k])
+        else:
+            j, i = divmod(k - len(head), len(days))
+            by_count = week0 + timedelta(weeks=(j + 1) * interval, days=days[i])
+        last = min(last, by_count)
+    return last
+
+
+def series_end(doc: dict) -> str:
+    """Дата окончания последнего вхождения (OPEN_END — если серия бесконечна)"""
+    rule = doc["recurrence"]
+    if not rule.get("until") and not rule.get("count"):
+        return OPEN_END
+    first = _d(doc["dateStart"])
+    duration = _d(doc.get("dateEnd") or doc["dateStart"]) - first
+    hi = date.max - duration
+    if rule.get("until"):
+        hi = min(hi, _d(rule["until"]))
+    last = _last_start(first, rule, hi)
+    return (last + duration).isoformat() if last else doc.get("dateEnd") or doc["dateStart"]
+
+
+def occurrence_docs(doc: dict, win_from: str, win_to: str) -> Iterator[dict]:
+    """Копии документа на каждое вхождение в окне (id остаётся id серии)"""
+    for start, end in expand(doc, win_from, win_to):
+        yield {
+            **doc,
+            "dateStart": start.isoformat(),
+            "dateEnd": end.isoformat(),
+            "occurrence": start.isoformat(),
+        }
+
+
+def overlap_days(doc: dict, win_from: str, win_to: str) -> int:
+    """Сколько дней серии попадает в окно"""
+    lo, hi = _d(win_from), _d(win_to)
+    total = 0
+    for start, end in expand(doc, win_from, win_to):
+        total += (min(end, hi) - max(start, lo)).days + 1
+    return total
@@ -0,0 +1,314 @@
+"""
+Локальная реплика для чтения (SQLite).
+
+Включается настройкой READ_REPLICA. Снимок коллекций assignments и users
+держат в актуальном состоянии listener'ы Firestore (on_snapshot); запись
+по-прежнему идёт только в Firestore.
+
+Хуки записи отмечают «ожидаемые» изменения, listener их снимает.
+Возраст самого старого неприменённого изменения — это лаг реплики:
+если он больше REPLICA_MAX_LAG или реплика ещё не загрузилась,
+чтения идут в Firestore.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+from . import hooks
+from .config import settings
+from .firestore import db
+
+COLLECTIONS = ("assignments", "users")
+
+# Ожидаемое изменение, которое так и не пришло (например, запись без эффекта), забываем
+PENDING_EXPIRE_SECONDS = 60
+
+SCHEMA = """
+DROP TABLE IF EXISTS assignments;
+DROP TABLE IF EXISTS assignment_workers;
+DROP TABLE IF EXISTS users;
+CREATE TABLE assignments (
+    id TEXT PRIMARY KEY,
+    project_id TEXT,
+    section_id TEXT,
+    date_start TEXT NOT NULL,   -- как в list_assignments: dateStart или ''
+    date_end TEXT NOT NULL,     -- dateEnd или dateStart (для серии — seriesEnd)
+    recurring INTEGER NOT NULL, -- повторяющаяся серия: вхождения разворачиваются в Python
+    load_start TEXT NOT NULL,   -- для нагрузки: dateStart или старое поле date
+    load_end TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE assignment_workers (
+    worker_uid TEXT NOT NULL,
+    assignment_id TEXT NOT NULL,
+    in_list INTEGER NOT NULL,   -- из workerIds (фильтр worker_uid в списке)
+    in_load INTEGER NOT NULL,   -- считается в нагрузку
+    PRIMARY KEY (worker_uid, assignment_id)
+) WITHOUT ROWID;
+CREATE INDEX ix_assignments_project ON assignments (project_id, date_start);
+CREATE INDEX ix_assignments_section ON assignments (section_id, date_start);
+CREATE INDEX ix_assignments_dates ON assignments (date_start, date_end);
+CREATE INDEX ix_assignments_load ON assignments (load_start, load_end);
+CREATE INDEX ix_assignment_workers_assignment ON assignment_workers (assignment_id);
+CREATE TABLE users (
+    id TEXT PRIMARY KEY,
+    role TEXT,
+    full_name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX ix_users_role ON users (role);
+"""
+
+
+def _json_default(v):
+    return v.isoformat() if hasattr(v, "isoformat") else str(v)
+
+
+class Replica:
+    def __init__(self, path: str, max_lag: float):
+        self.path = path
+        self.max_lag = max_lag
+        self.enabled = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._watches: dict[str, object] = {}
+        self._loaded: set[str] = set()
+        self._pending: dict[tuple[str, str], float] = {}
+        self._stats = {"applied": 0, "served": 0, "fallbacks": 0, "expired": 0}
+        self._last_applied_at: Optional[float] = None
+
+    # ---------- запуск и синхронизация ----------
+
+    def start(self) -> None:
+        with self._lock:
+            if self.enabled:
+                return
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.executescript(SCHEMA)
+            self.enabled = True
+        for c in COLLECTIONS:
+            self._watch(c)
+
+    def _watch(self, collection: str) -> None:
+        first = True
+
+        def on_snapshot(docs, changes, read_time):
+            nonlocal first
+            # первый снимок нового listener'а — вся коллекция: таблицу пересобираем из docs,
+            # иначе удалённое, пока старый listener лежал, так и осталось бы в реплике
+            self._apply(collection, changes, docs if first else None, read_time)
+            first = False
+
+        self._loaded.discard(collection)
+        self._watches[collection] = db.collection(collection).on_snapshot(on_snapshot)
+
+    def _apply(self, collection: str, changes, snapshot=None, read_time=None) -> None:
+        """changes — изменения; snapshot — полный список документов на read_time (заменяет таблицу целиком)"""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                if snapshot is not None:
+                    self._clear(cur, collection)
+                    for doc in snapshot:
+                        self._upsert(cur, collection, doc.id, doc.to_dict() or {})
+                    # снимок учитывает и удаления: ожидаемое до read_time ждать больше нечего
+                    cutoff = read_time.timestamp() if read_time else time.time()
+                    for key, ts in list(self._pending.items()):
+                        if key[0] == collection and ts <= cutoff:
+                            self._pending.pop(key, None)
+                else:
+                    for ch in changes:
+                        doc = ch.document
+                        if ch.type.name == "REMOVED":
+                            self._delete(cur, collection, doc.id)
+                        else:
+                            self._upsert(cur, collection, doc.id, doc.to_dict() or {})
+                        self._pending.pop((collection, doc.id), None)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            self._stats["applied"] += len(snapshot if snapshot is not None else changes)
+            self._last_applied_at = time.time()
+            self._loaded.add(collection)
+
+    def _clear(self, cur, collection: str) -> None:
+        if collection == "assignments":
+            cur.execute("DELETE FROM assignment_workers")
+        cur.execute(f"DELETE FROM {collection}")
+
+    def _delete(self, cur, collection: str, doc_id: str) -> None:
+        if collection == "assignments":
+            cur.execute("DELETE FROM assignment_workers WHERE assignment_id = ?", (doc_id,))
+        cur.execute(f"DELETE FROM {collection} WHERE id = ?", (doc_id,))
+
+    def _upsert(self, cur, collection: str, doc_id: str, data: dict) -> None:
+        self._delete(cur, collection, doc_id)
+        payload = json.dumps(data, ensure_ascii=False, default=_json_default)
+        if collection == "users":
+            cur.execute(
+                "INSERT INTO users (id, role, full_name, data) VALUES (?, ?, ?, ?)",
+                (doc_id, data.get("role"), data.get("full_name"), payload),
+            )
+            return
+
+        date_start = data.get("dateStart") or ""
+        date_end = data["dateEnd"] if "dateEnd" in data else date_start
+        if data.get("recurrence"):
+            date_end = data.get("seriesEnd") or date_end
+        legacy = not data.get("dateStart")
+        load_start = data.get("date", "") if legacy else date_start
+        load_end = load_start if legacy else (data.get("dateEnd") or date_start)
+        cur.execute(
+            "INSERT INTO assignments"
+            " (id, project_id, section_id, date_start, date_end, recurring, load_start, load_end, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (doc_id, data.get("projectId"), data.get("sectionId"), date_start, date_end or "",
+             int(bool(data.get("recurrence"))), load_start[:10], (load_end or "")[:10], payload),
+        )
+        list_workers = set(data.get("workerIds") or [])
+        load_workers = {data["worker_uid"]} if legacy and data.get("worker_uid") else list_workers
+        cur.executemany(
+            "INSERT INTO assignment_workers (worker_uid, assignment_id, in_list, in_load) VALUES (?, ?, ?, ?)",
+            [(w, doc_id, int(w in list_workers), int(w in load_workers)) for w in list_workers | load_workers],
+        )
+
+    def expect(self, collection: str, doc_id: str) -> None:
+        """Хук записи: изменение должно прийти через listener"""
+        if self.enabled:
+            self._pending.setdefault((collection, doc_id), time.time())
+
+    # ---------- состояние ----------
+
+    def lag(self) -> float:
+        now = time.time()
+        for key, ts in list(self._pending.items()):
+            if now - ts > PENDING_EXPIRE_SECONDS:
+                self._pending.pop(key, None)
+                self._stats["expired"] += 1
+        oldest = min(self._pending.values(), default=now)
+        return now - oldest
+
+    def fresh(self) -> bool:
+        if not self.enabled:
+            return False
+        for c, w in list(self._watches.items()):
+            # listener закрылся после ошибки — переподписываемся, пока читаем из Firestore
+            if getattr(w, "_closed", False):
+                with self._lock:
+                    # параллельный запрос мог уже переподписаться — второй listener не нужен
+                    if self._watches.get(c) is w:
+                        self._watch(c)
+        ok = len(self._loaded) == len(COLLECTIONS) and self.lag() <= self.max_lag
+        if not ok:
+            self._stats["fallbacks"] += 1
+        return ok
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "loaded": sorted(self._loaded),
+            "lag_seconds": round(self.lag(), 3),
+            "pending": len(self._pending),
+            "last_applied_at": self._last_applied_at,
+            **self._stats,
+        }
+
+    # ---------- чтение ----------
+
+    def _rows(self, sql: str, params) -> Iterator[tuple]:
+        """
+        Строки по одной, без fetchall() всей выборки в память.
+        Курсор — на своём соединении: в WAL читатель видит снимок на момент
+        запроса и не держит _lock, пока выгрузка медленно забирает строки.
+        """
+        self._stats["served"] += 1
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            yield from conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def assignments(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        worker_uid: Optional[str] = None,
+        project_id: Optional[str] = None,
+        section_id: Optional[str] = None,
+        recurring: Optional[bool] = None,
+    ) -> Iterator[dict]:
+        """То же, что queries.iter_assignments (без разворота серий), но из SQLite"""
+        sql = "SELECT a.id, a.data FROM assignments a"
+        where, params = [], []
+        if worker_uid:
+            sql += " JOIN assignment_workers w ON w.assignment_id = a.id AND w.in_list = 1"
+            where.append("w.worker_uid = ?")
+            params.append(worker_uid)
+        if project_id:
+            where.append("a.project_id = ?")
+            params.append(project_id)
+        if section_id:
+            where.append("a.section_id = ?")
+            params.append(section_id)
+        if date_from:
+            where.append("a.date_end >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("a.date_start <= ?")
+            params.append(date_to)
+        if recurring is not None:
+            where.append("a.recurring = ?")
+            params.append(int(recurring))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY a.id"
+        for doc_id, data in self._rows(sql, params):
+            yield {"id": doc_id, **json.loads(data)}
+
+    def worker_load_counts(
+        self,
+        date_from: str,
+        date_to: str,
+        worker_uid: Optional[str] = None,
+        project_id: Optional[str] = None,
+        section_id: Optional[str] = None,
+    ) -> dict[str, int]:
+        """Сумма пересечений назначений с периодом (в днях) по монтажникам; серии не учитываются"""
+        sql = (
+            "SELECT w.worker_uid, SUM(CAST(julianday(min(a.load_end, :to)) - julianday(max(a.load_start, :from)) AS INTEGER) + 1)"
+            " FROM assignments a JOIN assignment_workers w ON w.assignment_id = a.id AND w.in_load = 1"
+            " WHERE a.recurring = 0 AND a.load_start != '' AND a.load_start <= :to AND a.load_end >= :from"
+        )
+        params = {"from": date_from, "to": date_to}
+        if worker_uid:
+            sql += " AND w.worker_uid = :worker"
+            params["worker"] = worker_uid
+        if project_id:
+            sql += " AND a.project_id = :project"
+            params["project"] = project_id
+        if section_id:
+            sql += " AND a.section_id = :section"
+            params["section"] = section_id
+        sql += " GROUP BY w.worker_uid"
+        return {uid: int(days) for uid, days in self._rows(sql, params) if days and days > 0}
+
+    def user_names(self, uids: list[str]) -> dict[str, str]:
+        if not uids:
+            return {}
+        marks = ",".join("?" * len(uids))
+        rows = self._rows(f"SELECT id, full_name FROM users WHERE id IN ({marks})", list(uids))
+        return {uid: name for uid, name in rows if name is not None}
+
+
+replica = Replica(settings.REPLICA_PATH, settings.REPLICA_MAX_LAG)
+
+for _collection in COLLECTIONS:
+    hooks.subscribe(_collection, lambda op, doc_id, data, c=_collection: replica.expect(c, doc_id))
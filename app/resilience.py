@@ -0,0 +1,189 @@
+"""
+Устойчивость к тормозам Firestore.
+
+Чтения идут через read(key, fn):
+  * у каждого вызова свой дедлайн (FIRESTORE_TIMEOUT), запрос не висит
+    до дефолтного дедлайна SDK;
+  * временные ошибки повторяются с экспоненциальной задержкой и jitter;
+  * после BREAKER_THRESHOLD неудач подряд размыкается предохранитель:
+    Firestore не дёргаем BREAKER_RESET_SECONDS, потом пробуем одним запросом;
+  * пока предохранитель разомкнут (или запрос не удался), отдаём последний
+    удачный результат по тому же ключу и помечаем ответ заголовком X-Data-Stale.
+
+Запись при разомкнутом предохранителе сразу получает 503 (см. middleware в main).
+
+Дедлайн передаётся и в сам вызов SDK (READ / WRITE): по таймауту RPC
+отменяется, а не продолжает занимать поток пула _io.
+"""
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from google.api_core import exceptions as gexc
+
+from .config import settings
+from .singleflight import flight
+
+# Ошибки, при которых есть смысл повторить чтение
+TRANSIENT = (
+    gexc.DeadlineExceeded,
+    gexc.ServiceUnavailable,
+    gexc.InternalServerError,
+    gexc.ResourceExhausted,
+    gexc.Aborted,
+    gexc.RetryError,
+    TimeoutError,
+    FutureTimeout,
+)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            # в полуоткрытом состоянии пропускаем один пробный запрос
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    self._stats["opened"] += 1
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "open_for_seconds": round(time.monotonic() - self._opened_at, 1) if self._opened_at else 0,
+            **self._stats,
+        }
+
+
+breaker = CircuitBreaker(settings.BREAKER_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+
+# Параметры вызовов SDK: .stream(**READ), ref.update(..., **WRITE).
+# Чтения повторяет read(), поэтому собственные повторы SDK для них выключены.
+READ = {"timeout": settings.FIRESTORE_TIMEOUT, "retry": None}
+WRITE = {"timeout": settings.FIRESTORE_TIMEOUT}
+
+# Отдельный пул: по истечении дедлайна запрос отпускаем, а зависший вызов SDK дорабатывает здесь
+_io = ThreadPoolExecutor(max_workers=16, thread_name_prefix="firestore-io")
+
+# Последние удачные результаты по ключу (не больше STALE_MAX_KEYS, старые вытесняются)
+STALE_MAX_KEYS = 512
+_stale: dict[tuple, tuple[float, Any]] = {}
+_stale_lock = threading.Lock()
+
+# Состояние текущего HTTP-запроса: ставит middleware, читает — при формировании ответа
+_request_state: ContextVar[Optional[dict]] = ContextVar("resilience_request_state", default=None)
+
+
+def begin_request() -> dict:
+    state = {"stale_age": None}
+    _request_state.set(state)
+    return state
+
+
+def _mark_stale(age: float) -> None:
+    state = _request_state.get()
+    if state is not None:
+        state["stale_age"] = max(age, state["stale_age"] or 0)
+
+
+def _remember(key: tuple, value: Any) -> None:
+    with _stale_lock:
+        _stale.pop(key, None)
+        _stale[key] = (time.time(), value)
+        while len(_stale) > STALE_MAX_KEYS:
+            del _stale[next(iter(_stale))]
+
+
+def _fallback(key: tuple, error: Optional[BaseException], stale: bool):
+    with _stale_lock:
+        cached = _stale.get(key) if stale else None
+    if cached and time.time() - cached[0] <= settings.STALE_TTL_SECONDS:
+        return cached[1], time.time() - cached[0]
+    raise HTTPException(503, "Firestore временно недоступен") from error
+
+
+def _guarded(key: tuple, fn: Callable[[], Any], idempotent: bool, stale: bool):
+    """(значение, возраст устаревших данных или None)"""
+    if not breaker.allow():
+        return _fallback(key, None, stale)
+
+    attempts = 1 + (settings.FIRESTORE_RETRIES if idempotent else 0)
+    error: Optional[BaseException] = None
+    for attempt in range(attempts):
+        if attempt:
+            # full jitter: 0 … base * 2^attempt
+            time.sleep(random.uniform(0, settings.FIRESTORE_RETRY_BASE * 2 ** attempt))
+        future = _io.submit(contextvars.copy_context().run, fn)
+        try:
+            # запас на случай вызова без READ: сам RPC должен упасть по своему дедлайну раньше
+            value = future.result(timeout=settings.FIRESTORE_TIMEOUT + 1)
+        except TRANSIENT as e:
+            error = e
+            continue
+        except BaseException:
+            # не временная ошибка (NotFound, 4xx) — Firestore жив
+            breaker.success()
+            raise
+        breaker.success()
+        if stale:
+            _remember(key, value)
+        return value, None
+
+    breaker.failure()
+    return _fallback(key, error, stale)
+
+
+def read(key: tuple, fn: Callable[[], Any], idempotent: bool = True, stale: bool = True) -> Any:
+    """
+    Чтение с дедлайном, повторами, предохранителем и склейкой одинаковых запросов.
+    stale=False — без устаревших данных: при сбое сразу 503 (права доступа и т.п.).
+    """
+    value, stale_age = flight.do(key, lambda: _guarded(key, fn, idempotent, stale))
+    if stale_age is not None:
+        _mark_stale(stale_age)
+    return value
+
+
+def stats() -> dict:
+    return {**breaker.snapshot(), "stale_keys": len(_stale)}
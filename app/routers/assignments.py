@@ -1,17 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Literal
+from datetime import datetime, date
 from ..auth import require_role, get_user
 from ..firestore import db
+from google.cloud import firestore
+from google.api_core import exceptions as gexc
+from .. import counters, hooks, preconditions, recurrence
+from ..queries import iter_assignments
+from ..resilience import READ, WRITE, read
+from ..projection import cache_key, parse_fields
+from ..logs import get_logger, kv
 from fastapi.responses import RedirectResponse
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
+log = get_logger(__name__)
 
 # =============================
 # 📘 МОДЕЛИ
 # =============================
 
+class Recurrence(BaseModel):
+    freq: Literal["daily", "weekly"] = "weekly"
+    interval: int = Field(1, ge=1, le=52)
+    byweekday: List[int] = []          # 0 = пн … 6 = вс; пусто — день недели dateStart
+    until: Optional[str] = None        # YYYY-MM-DD включительно
+    count: Optional[int] = Field(None, ge=1, le=1000)
+
+
 class AssignmentCreate(BaseModel):
     projectId: str
     statusId: str
@@ -24,6 +40,8 @@ class AssignmentCreate(BaseModel):
     sectionName: Optional[str] = None
     state: str = "in_progress"
     comments: Optional[str] = ""
+    recurrence: Optional[Recurrence] = None
+    exdates: List[str] = []            # пропущенные вхождения (даты начала)
 
 
 class AssignmentUpdate(BaseModel):
@@ -37,6 +55,17 @@ class AssignmentUpdate(BaseModel):
     sectionName: Optional[str] = None
     state: Optional[str] = None
     comments: Optional[str] = None
+    recurrence: Optional[Recurrence] = None   # null или {} — снять повтор
+    exdates: Optional[List[str]] = None
+
+    @field_validator("recurrence", mode="before")
+    @classmethod
+    def _empty_recurrence(cls, v):
+        return None if v == {} else v
+
+
+# Поля серии: при снятии повтора удаляются из документа
+SERIES_FIELDS = ("recurrence", "exdates", "seriesEnd")
 
 
 # =============================
@@ -57,6 +86,24 @@ def _normalize_section(section_id: Optional[str], section_name: Optional[str]) -
     return sid, sname
 
 
+def _recurrence_fields(doc: dict) -> dict:
+    """Проверяет правило повтора и считает seriesEnd (для обычного назначения — пусто)"""
+    rule = doc.get("recurrence")
+    if not rule:
+        return {}
+    if any(not 0 <= w <= 6 for w in rule.get("byweekday") or []):
+        raise HTTPException(400, "byweekday: дни недели 0 (пн) … 6 (вс)")
+    try:
+        if rule.get("until"):
+            rule["until"] = _normalize_date(rule["until"])
+            if date.fromisoformat(rule["until"]) < date.fromisoformat(doc["dateStart"][:10]):
+                raise HTTPException(400, "until раньше даты начала")
+        exdates = sorted({date.fromisoformat(_normalize_date(x)).isoformat() for x in doc.get("exdates") or []})
+    except ValueError:
+        raise HTTPException(400, "Неверный формат дат (YYYY-MM-DD)")
+    return {"recurrence": rule, "exdates": exdates, "seriesEnd": recurrence.series_end({**doc, "recurrence": rule})}
+
+
 def _resolve_status(status_id: str) -> dict:
     """Проверяет, что статус существует в Firestore. Ошибка, если нет."""
     if not status_id:
@@ -81,29 +128,27 @@ def list_assignments(
     worker_uid: Optional[str] = Query(None),
     project_id: Optional[str] = Query(None),
     section_id: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Поля/пресеты через запятую: summary, calendar"),
 ):
     """Получение списка назначений с фильтрацией"""
-    q = db.collection("assignments")
-    if project_id:
-        q = q.where("projectId", "==", project_id)
-    if section_id:
-        q = q.where("sectionId", "==", section_id)
-    if worker_uid:
-        q = q.where("workerIds", "array_contains", worker_uid)
-
-    docs = [{"id": d.id, **(d.to_dict() or {})} for d in q.stream()]
-
-    if date_from:
-        docs = [x for x in docs if x.get("dateEnd", x.get("dateStart", "")) >= date_from]
-    if date_to:
-        docs = [x for x in docs if x.get("dateStart", "") <= date_to]
-    return docs
+    cols = parse_fields("assignments", fields)
+    key = ("assignments", date_from, date_to, worker_uid, project_id, section_id, cache_key(cols))
+    return read(key, lambda: list(iter_assignments(date_from, date_to, worker_uid, project_id, section_id, cols, rpc=READ)))
 
 
 @router.post("/", dependencies=[Depends(require_role("admin", "manager"))])
 def create_assignment(payload: AssignmentCreate):
-    """Создание одного назначения на диапазон дат"""
-    print("📥 CREATE ASSIGNMENT:", payload.model_dump())
+    """Создание назначения на диапазон дат (или повторяющейся серии, если задан recurrence)"""
+    # только id и количества: ФИО и свободный текст (comments) в лог не пишем
+    log.debug("assignment.create.payload", extra=kv(
+        sampled=True,
+        projectId=payload.projectId,
+        statusId=payload.statusId,
+        sectionId=payload.sectionId,
+        workerIds=payload.workerIds,
+        workers=len(payload.workerNames),
+        recurring=payload.recurrence is not None,
+    ))
 
     start_str = _normalize_date(payload.dateStart)
     end_str = _normalize_date(payload.dateEnd or payload.dateStart)
@@ -140,9 +185,21 @@ def create_assignment(payload: AssignmentCreate):
         "comments": payload.comments or "",
         "created_at": datetime.utcnow().isoformat(),
     }
-
-    print("✅ ASSIGNMENT DATA TO SAVE:", data)
-    ref.set(data)
+    # Повторяющаяся серия: храним только правило и исключения
+    if payload.recurrence:
+        data.update(_recurrence_fields({
+            "dateStart": start_str,
+            "dateEnd": end_str,
+            "recurrence": payload.recurrence.model_dump(exclude_none=True),
+            "exdates": payload.exdates,
+        }))
+
+    batch = db.batch()
+    batch.set(ref, data)
+    counters.apply(batch, counters.assignment_delta(None, data))
+    batch.commit(**WRITE)
+    log.info("assignment.created", extra=kv(id=ref.id, projectId=data["projectId"], workers=len(data["workerIds"])))
+    hooks.emit("assignments", "set", ref.id, data)
     return {"id": ref.id, **data}
 
 
@@ -152,54 +209,106 @@ def update_assignment(
     payload: AssignmentUpdate,
     current_user: dict = Depends(get_user),
 ):
-    """Обновление назначения"""
+    """Обновление назначения (вместе со счётчиками дашборда — в одной транзакции)"""
     ref = db.collection("assignments").document(assignment_id)
-    doc = ref.get()
-    if not doc.exists:
-        raise HTTPException(404, "Назначение не найдено")
-
     role = current_user.get("role")
     email = (current_user.get("email") or "").strip().lower()
-    updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
+    payload_updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
+    if "recurrence" in payload.model_fields_set and payload.recurrence is None:
+        payload_updates["recurrence"] = None
 
     # Обновляем имя статуса, если изменился ID
-    if "statusId" in updates:
-        st = _resolve_status(updates["statusId"])
-        updates["statusName"] = updates.get("statusName") or st["name"]
+    if "statusId" in payload_updates:
+        st = _resolve_status(payload_updates["statusId"])
+        payload_updates["statusName"] = payload_updates.get("statusName") or st["name"]
+
+    @firestore.transactional
+    def write(transaction) -> Optional[dict]:
+        doc = ref.get(transaction=transaction, **READ)
+        if not doc.exists:
+            raise HTTPException(404, "Назначение не найдено")
+        if not payload_updates:
+            return None
+        current = doc.to_dict() or {}
+        updates = dict(payload_updates)
+
+        # Админ/менеджер — всё можно
+        if role in ("admin", "manager"):
+            if "recurrence" in updates and updates["recurrence"] is None:
+                updates.update(dict.fromkeys(SERIES_FIELDS))
+            elif {"dateStart", "dateEnd", "recurrence", "exdates"} & updates.keys() and (
+                "recurrence" in updates or current.get("recurrence")
+            ):
+                updates.update(_recurrence_fields({**current, **updates}))
+
+        # Монтажник — только state и comments
+        elif role == "installer":
+            if email not in (current.get("workerIds") or []):
+                raise HTTPException(403, "Недостаточно прав")
+            allowed_fields = {"state", "comments"}
+            for k in updates:
+                if k not in allowed_fields:
+                    raise HTTPException(403, f"Поле '{k}' нельзя менять")
+
+        else:
+            raise HTTPException(403, "Недостаточно прав")
 
-    if not updates:
+        updates["updated_at"] = datetime.utcnow().isoformat()
+        transaction.update(ref, {
+            k: firestore.DELETE_FIELD if v is None and k in SERIES_FIELDS else v
+            for k, v in updates.items()
+        })
+        counters.apply(transaction, counters.assignment_delta(current, {**current, **updates}))
+        return updates
+
+    updates = write(db.transaction())
+    if updates is None:
         return {"ok": True, "message": "Нет изменений"}
+    hooks.emit("assignments", "update", assignment_id, updates)
+    log.info("assignment.updated", extra=kv(id=assignment_id, fields=sorted(updates), by=role))
+    return {"ok": True}
 
-    # Админ/менеджер — всё можно
-    if role in ("admin", "manager"):
-        updates["updated_at"] = datetime.utcnow().isoformat()
-        ref.update(updates)
-        return {"ok": True}
 
-    # Монтажник — только state и comments
-    if role == "installer":
-        data = doc.to_dict() or {}
-        if email not in (data.get("workerIds") or []):
-            raise HTTPException(403, "Недостаточно прав")
-        allowed_fields = {"state", "comments"}
-        for k in updates:
-            if k not in allowed_fields:
-                raise HTTPException(403, f"Поле '{k}' нельзя менять")
-        updates["updated_at"] = datetime.utcnow().isoformat()
-        ref.update(updates)
-        return {"ok": True}
+@router.delete("/{assignment_id}", dependencies=[Depends(require_role("admin", "manager"))])
+def delete_assignment(assignment_id: str, if_match: Optional[str] = Header(None)):
+    """Удаление назначения (If-Match: версия → 409, если назначение изменили)"""
+    ref = db.collection("assignments").document(assignment_id)
 
-    raise HTTPException(403, "Недостаточно прав")
+    # state и проект удаляемого назначения нужны счётчикам: читаем только их,
+    # удаляем с предусловием «не менялось с прочтения» вместе с приращениями
+    def remove(batch, data: dict, option) -> None:
+        batch.delete(ref, option=option)
+        counters.apply(batch, counters.assignment_delta(data, None))
 
+    preconditions.conditional_write(ref, ["projectId", "state"], remove, if_match, "Назначение не найдено")
+    hooks.emit("assignments", "delete", assignment_id)
+    log.info("assignment.deleted", extra=kv(id=assignment_id))
+    return {"ok": True}
 
-@router.delete("/{assignment_id}", dependencies=[Depends(require_role("admin", "manager"))])
-def delete_assignment(assignment_id: str):
-    """Удаление назначения"""
+
+@router.delete("/{assignment_id}/occurrences/{occurrence}", dependencies=[Depends(require_role("admin", "manager"))])
+def skip_occurrence(assignment_id: str, occurrence: str):
+    """Исключить одно вхождение повторяющейся серии (дата начала вхождения)"""
+    try:
+        day = date.fromisoformat(_normalize_date(occurrence)).isoformat()
+    except ValueError:
+        raise HTTPException(400, "Неверный формат дат (YYYY-MM-DD)")
     ref = db.collection("assignments").document(assignment_id)
-    if not ref.get().exists:
+    # только для проверки «это серия» и ответа; сама запись — ArrayUnion, без гонки read-modify-write
+    doc = ref.get(field_paths=["recurrence", "exdates"], **READ)
+    if not doc.exists:
         raise HTTPException(404, "Назначение не найдено")
-    ref.delete()
-    return {"ok": True}
+    data = doc.to_dict() or {}
+    if not recurrence.is_recurring(data):
+        raise HTTPException(400, "Назначение не повторяется")
+    try:
+        ref.update({"exdates": firestore.ArrayUnion([day]), "updated_at": datetime.utcnow().isoformat()}, **WRITE)
+    except gexc.NotFound:
+        raise HTTPException(404, "Назначение не найдено")
+    exdates = sorted(set(data.get("exdates") or []) | {day})
+    hooks.emit("assignments", "update", assignment_id, {"exdates": exdates})
+    log.info("assignment.occurrence_skipped", extra=kv(id=assignment_id, occurrence=day))
+    return {"ok": True, "exdates": exdates}
 
 
 @router.post("", include_in_schema=False)
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+import json
+import os
+import re
+import threading
+from ..auth import require_role
+from ..config import settings
+from .. import backup
+from ..logs import get_logger, kv
+
+router = APIRouter(prefix="/backup", tags=["backup"])
+log = get_logger(__name__)
+
+_NAME = re.compile(r"^[\w.-]+$")
+
+# Состояние фоновых задач этого процесса: имя копии → статус
+_jobs: dict[str, dict] = {}
+_lock = threading.Lock()
+
+# =============================
+# 📘 МОДЕЛИ
+# =============================
+
+class BackupCreate(BaseModel):
+    collections: Optional[list[str]] = None
+    partitions: int = 8
+
+
+class RestoreRequest(BaseModel):
+    collections: Optional[list[str]] = None
+    rate: Optional[float] = None     # записей/с на старте, 0 — без лимита
+    fresh: bool = False              # не продолжать прерванное восстановление
+
+
+# =============================
+# 📗 РОУТЫ
+# =============================
+
+def _path(name: str) -> str:
+    if not _NAME.match(name):
+        raise HTTPException(400, "Некорректное имя копии")
+    return os.path.join(settings.BACKUP_DIR, name)
+
+
+def _run(name: str, action: str, fn, *args, **kwargs) -> None:
+    try:
+        result = fn(*args, **kwargs)
+        status = {"action": action, "state": "done", "result": result}
+    except Exception as e:
+        log.exception("backup.failed", extra=kv(name=name, action=action))
+        status = {"action": action, "state": "failed", "error": str(e)}
+    with _lock:
+        _jobs[name] = {**_jobs.get(name, {}), **status, "finished_at": datetime.utcnow().isoformat()}
+
+
+def _start(name: str, action: str) -> None:
+    with _lock:
+        if _jobs.get(name, {}).get("state") == "running":
+            raise HTTPException(409, "По этой копии уже идёт задача")
+        _jobs[name] = {"action": action, "state": "running", "started_at": datetime.utcnow().isoformat()}
+
+
+@router.get("/", dependencies=[Depends(require_role("admin"))])
+def list_backups():
+    """Копии в BACKUP_DIR и статус задач"""
+    out = []
+    names = set(_jobs)
+    if os.path.isdir(settings.BACKUP_DIR):
+        names |= set(os.listdir(settings.BACKUP_DIR))
+    for name in sorted(names, reverse=True):
+        item = {"name": name, "complete": False, "job": _jobs.get(name)}
+        manifest = os.path.join(settings.BACKUP_DIR, name, backup.MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as f:
+                m = json.load(f)
+            item.update(
+                complete=True,
+                created_at=m["created_at"],
+                documents={k: v["documents"] for k, v in m["collections"].items()},
+            )
+        out.append(item)
+    return out
+
+
+@router.post("/", dependencies=[Depends(require_role("admin"))])
+def create_backup(payload: BackupCreate, background: BackgroundTasks):
+    """Запускает выгрузку в фоне; готовность — по GET /backup/"""
+    unknown = set(payload.collections or ()) - set(backup.COLLECTIONS)
+    if unknown:
+        raise HTTPException(400, f"Неизвестные коллекции: {', '.join(sorted(unknown))}")
+    name = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    _start(name, "export")
+    background.add_task(
+        _run, name, "export", backup.export, _path(name),
+        payload.collections or backup.COLLECTIONS, payload.partitions,
+    )
+    log.info("backup.started", extra=kv(name=name))
+    return {"name": name, "state": "running"}
+
+
+@router.post("/{name}/restore", dependencies=[Depends(require_role("admin"))])
+def restore_backup(name: str, payload: RestoreRequest, background: BackgroundTasks):
+    """Восстановление из копии в фоне (продолжает прерванное, если fresh=false)"""
+    path = _path(name)
+    if not os.path.exists(os.path.join(path, backup.MANIFEST)):
+        raise HTTPException(404, "Копия не найдена или не завершена")
+    _start(name, "restore")
+    background.add_task(
+        _run, name, "restore", backup.restore, path,
+        payload.collections, payload.rate, resume=not payload.fresh,
+    )
+    log.info("backup.restore_started", extra=kv(name=name, fresh=payload.fresh))
+    return {"name": name, "state": "running"}
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from ..auth import require_role
+from ..resilience import read
+from .. import counters
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+@router.get("/stats", dependencies=[Depends(require_role("admin", "manager"))])
+def dashboard_stats():
+    """Назначения по состояниям и проектам, заявки по статусам (сумма шардов счётчиков)"""
+    return read(("counters",), counters.stats)
+
+
+@router.post("/reconcile", dependencies=[Depends(require_role("admin"))])
+def reconcile_counters():
+    """Пересчёт счётчиков по коллекциям; возвращает исправленное расхождение"""
+    return counters.reconcile()
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Header, Response
 from pydantic import BaseModel
 from typing import Optional, List
 from ..auth import require_role
 from ..firestore import db
+from .. import hooks, preconditions
+from ..resilience import READ, WRITE, read
+from ..projection import cache_key, parse_fields, select
+from ..timeline import cache as timeline_cache
+from ..logs import get_logger, kv
 from datetime import datetime
 
 router = APIRouter(prefix="/projects", tags=["projects"])
+log = get_logger(__name__)
 
 # =======================
 # 📘 МОДЕЛИ
@@ -56,15 +62,25 @@ class ProjectUpdate(BaseModel):
 # =======================
 
 @router.get("/", dependencies=[Depends(require_role("admin","manager","installer","worker"))])
-def list_projects():
+def list_projects(
+    fields: Optional[str] = Query(None, description="Поля/пресеты через запятую: summary, dropdown"),
+):
     """Список всех проектов"""
-    q = db.collection("projects")
-    try:
-        q = q.order_by("start_date")
-    except Exception:
-        q = q.order_by("created_at")
-    docs = [{"id": d.id, **(d.to_dict() or {})} for d in q.stream()]
-    return docs
+    cols = parse_fields("projects", fields)
+
+    def fetch():
+        q = db.collection("projects")
+        try:
+            q = q.order_by("start_date")
+        except Exception:
+            q = q.order_by("created_at")
+        q = select(q, cols)
+        return [
+            {"id": d.id, **(d.to_dict() or {}), "version": preconditions.version(d.update_time)}
+            for d in q.stream(**READ)
+        ]
+
+    return read(("projects", cache_key(cols)), fetch)
 
 
 @router.post("/", dependencies=[Depends(require_role("admin","manager"))])
@@ -73,50 +89,70 @@ def create_project(payload: ProjectCreate):
     ref = db.collection("projects").document()
     doc = payload.model_dump()
     doc["created_at"] = datetime.utcnow().isoformat()
-    db.collection("projects").document(ref.id).set(doc)
+    db.collection("projects").document(ref.id).set(doc, **WRITE)
+    hooks.emit("projects", "set", ref.id, doc)
+    log.info("project.created", extra=kv(id=ref.id))
     return {"id": ref.id, **doc}
 
 
 @router.put("/{project_id}", dependencies=[Depends(require_role("admin","manager"))])
-def update_project(project_id: str, payload: ProjectUpdate):
-    """Редактирование проекта"""
+def update_project(
+    project_id: str,
+    payload: ProjectUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    """Редактирование проекта (If-Match: версия → 409, если проект изменили)"""
     ref = db.collection("projects").document(project_id)
-    snap = ref.get()
-    if not snap.exists:
-        raise HTTPException(404, "Project not found")
-
     updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
 
     # 👇 Если проект деактивируется — добавляем время архивации
     if "active" in updates and updates["active"] is False:
         updates["archived_at"] = datetime.utcnow().isoformat()
 
-    if updates:
+    if not updates:
+        version = preconditions.current(ref, if_match, "Project not found")
+    else:
         updates["updated_at"] = datetime.utcnow().isoformat()
-        ref.update(updates)
-    return {"ok": True}
+        version = preconditions.update(ref, updates, if_match, "Project not found")
+        hooks.emit("projects", "update", project_id, updates)
+        log.info("project.updated", extra=kv(id=project_id, fields=sorted(updates)))
+    preconditions.set_etag(response, version)
+    return {"ok": True, "version": version}
 
 
 @router.delete("/{project_id}", dependencies=[Depends(require_role("admin","manager"))])
-def delete_project(project_id: str):
-    """Удаление проекта"""
+def delete_project(project_id: str, if_match: Optional[str] = Header(None)):
+    """Удаление проекта; без If-Match повторное удаление не ошибка"""
     ref = db.collection("projects").document(project_id)
-    if ref.get().exists:
-        ref.delete()
+    if preconditions.delete(ref, if_match):
+        hooks.emit("projects", "delete", project_id)
+        log.info("project.deleted", extra=kv(id=project_id))
     return {"ok": True}
 
 
 @router.get("/{project_id}", dependencies=[Depends(require_role("admin","manager","installer","worker"))])
-def get_project(project_id: str):
+def get_project(project_id: str, response: Response):
     """Получение проекта по ID"""
     doc = db.collection("projects").document(project_id).get()
     if not doc.exists:
         raise HTTPException(404, "Project not found")
     data = doc.to_dict()
     data["id"] = doc.id
+    data["version"] = preconditions.version(doc.update_time)
+    preconditions.set_etag(response, data["version"])
     return data
 
 
+@router.get("/{project_id}/timeline", dependencies=[Depends(require_role("admin","manager","installer","worker"))])
+def project_timeline(project_id: str):
+    """Таймлайн проекта: отрезки по разделам и статусам, покрытие и отставание от договора"""
+    result = timeline_cache.get(project_id)
+    if result is None:
+        raise HTTPException(404, "Project not found")
+    return result
+
+
 @router.get("/archive", dependencies=[Depends(require_role("admin","manager"))])
 def archived_projects():
     """Архив завершённых проектов"""
@@ -140,11 +176,14 @@ async def upload_docs(project_id: str, file: UploadFile = File(...)):
     files = data.get("docs_files", [])
     files.append(file.filename)
 
-    ref.update({
+    updates = {
         "docs_files": files,
         "docs_available": True,
         "updated_at": datetime.utcnow().isoformat()
-    })
+    }
+    ref.update(updates, **WRITE)
+    hooks.emit("projects", "update", project_id, updates)
+    log.info("project.doc_attached", extra=kv(id=project_id, filename=file.filename))
     return {"ok": True, "filename": file.filename}
 
 
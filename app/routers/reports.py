@@ -1,33 +1,75 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Literal
+from datetime import date
+import os
 from ..auth import require_role
-from ..firestore import db
+from ..queries import worker_load_rows
+from .. import export
+from ..logs import get_logger, kv
 
 class LoadRequest(BaseModel):
     date_from: str   # "YYYY-MM-DD"
     date_to: str     # "YYYY-MM-DD"
 
 router = APIRouter(prefix="/reports", tags=["reports"])
+log = get_logger(__name__)
 
 @router.post("/worker-load", dependencies=[Depends(require_role("admin","manager"))])
 def worker_load(payload: LoadRequest):
-    items = [{ "id": d.id, **(d.to_dict() or {}) } for d in db.collection("assignments").stream()]
-    items = [x for x in items if payload.date_from <= x.get("date","") <= payload.date_to]
-    # агрегируем по worker_uid
-    agg: Dict[str, int] = {}
-    for x in items:
-        w = x.get("worker_uid")
-        if not w: continue
-        agg[w] = agg.get(w, 0) + 1
-    # подтянем имена
-    out = []
-    for uid, cnt in agg.items():
-        udoc = db.collection("users").document(uid).get()
-        u = udoc.to_dict() or {}
-        out.append({
-            "worker_uid": uid,
-            "full_name": u.get("full_name", uid),
-            "days": cnt
-        })
-    return sorted(out, key=lambda r: r["full_name"])
+    return worker_load_rows(payload.date_from, payload.date_to)
+
+
+def _date_param(name: str, value: Optional[str]) -> Optional[str]:
+    """Дата из query → YYYY-MM-DD; мусор (в т.ч. кавычки для заголовка) — 422"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(422, f"{name}: ожидается дата YYYY-MM-DD")
+
+
+@router.get("/export", dependencies=[Depends(require_role("admin","manager"))])
+async def export_report(
+    kind: Literal["assignments", "worker-load"] = Query("assignments"),
+    format: Literal["csv", "xlsx"] = Query("csv"),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    worker_uid: Optional[str] = Query(None),
+    project_id: Optional[str] = Query(None),
+    section_id: Optional[str] = Query(None),
+):
+    """Выгрузка назначений или нагрузки в CSV (потоком) или XLSX"""
+    date_from = _date_param("date_from", date_from)
+    date_to = _date_param("date_to", date_to)
+    if kind == "worker-load" and not (date_from and date_to):
+        raise HTTPException(400, "Для нагрузки нужны date_from и date_to")
+
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "worker_uid": worker_uid,
+        "project_id": project_id,
+        "section_id": section_id,
+    }
+    log.info("report.export", extra=kv(kind=kind, format=format, **filters))
+    name = f"{kind}_{date_from or 'all'}_{date_to or 'all'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{name}"'}
+
+    if format == "csv":
+        return StreamingResponse(
+            export.iter_csv(kind, filters),
+            media_type="text/csv; charset=utf-8",
+            headers=headers,
+        )
+
+    path = await export.build_xlsx_async(kind, filters)
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers,
+        background=BackgroundTask(os.remove, path),
+    )
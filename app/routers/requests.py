@@ -1,39 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException
-from ..auth import require_role
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from typing import Optional
+from google.cloud import firestore
+from ..auth import require_role, get_user
 from ..firestore import db
-from datetime import date, timedelta
+from ..models import ExtendRequest
+from .. import counters, hooks, loader, preconditions
+from ..resilience import READ
+from datetime import date, datetime, timedelta
+from ..logs import get_logger, kv
 
 router = APIRouter(prefix="/requests", tags=["requests"])
+log = get_logger(__name__)
 
 @router.get("/")
-async def list_requests(status: str | None = None):
+def list_requests(status: str | None = None):
+    """Заявки с данными назначения и проекта (по одному get_all на коллекцию, а не get на заявку)"""
     q = db.collection('requests')
     if status:
         q = q.where('status','==',status)
-    return [{"id": d.id, **d.to_dict()} for d in q.stream()]
+    items = [{"id": d.id, **d.to_dict()} for d in q.stream()]
+
+    docs = loader.current()
+    assignments = {
+        aid: snap.to_dict() or {}
+        for aid, snap in docs.load_many('assignments', (r.get('assignmentId') for r in items)).items()
+    }
+    projects = docs.load_many('projects', (a.get('projectId') for a in assignments.values()))
+    for r in items:
+        a = assignments.get(r.get('assignmentId')) or {}
+        p = projects.get(a.get('projectId'))
+        r.update({
+            'projectId': a.get('projectId'),
+            'projectName': (p.to_dict() or {}).get('name') if p is not None else None,
+            'dateStart': a.get('dateStart'),
+            'dateEnd': a.get('dateEnd'),
+            'workerIds': a.get('workerIds') or [],
+            'workerNames': a.get('workerNames') or [],
+        })
+    return items
+
+@router.post("/")
+def create_request(payload: ExtendRequest, current_user: dict = Depends(get_user)):
+    """Заявка на продление назначения; назначение переходит в extend_requested"""
+    email = (current_user.get("email") or "").strip().lower()
+    aref = db.collection('assignments').document(payload.assignmentId)
+    rref = db.collection('requests').document()
+    r = {
+        **payload.model_dump(),
+        'status': 'pending',
+        'requestedBy': email,
+        'created_at': datetime.utcnow().isoformat(),
+    }
+
+    @firestore.transactional
+    def write(transaction):
+        adoc = aref.get(transaction=transaction, **READ)
+        if not adoc.exists:
+            raise HTTPException(404)
+        a = adoc.to_dict() or {}
+        if current_user.get("role") not in ('admin', 'manager') and email not in (a.get('workerIds') or []):
+            raise HTTPException(403, "Недостаточно прав")
+        transaction.set(rref, r)
+        transaction.update(aref, {'state': 'extend_requested'})
+        counters.apply(
+            transaction,
+            counters.combine(
+                counters.request_delta(None, r),
+                counters.assignment_delta(a, {**a, 'state': 'extend_requested'}),
+            ),
+        )
+
+    write(db.transaction())
+    hooks.emit('requests', 'set', rref.id, r)
+    hooks.emit('assignments', 'update', aref.id, {'state': 'extend_requested'})
+    log.info("request.created", extra=kv(id=rref.id, assignmentId=aref.id, extraDays=payload.extraDays))
+    return {"id": rref.id, **r}
 
 @router.post("/{rid}/approve", dependencies=[Depends(require_role('admin'))])
-async def approve(rid: str):
+def approve(rid: str):
     rref = db.collection('requests').document(rid)
-    rdoc = rref.get()
-    if not rdoc.exists:
-        raise HTTPException(404)
-    r = rdoc.to_dict()
-    aref = db.collection('assignments').document(r['assignmentId'])
-    adoc = aref.get()
-    if not adoc.exists:
-        raise HTTPException(404)
-    a = adoc.to_dict()
-    new_end = date.fromisoformat(a['dateEnd']) + timedelta(days=int(r['extraDays']))
-    aref.update({'dateEnd': new_end.isoformat(), 'state':'in_progress'})
-    rref.update({'status':'approved'})
-    db.collection('notifications').add({'type':'extend_approved','assignmentId': aref.id,'requestId': rid})
+
+    # заявка, назначение и счётчики дашборда меняются одной транзакцией
+    @firestore.transactional
+    def write(transaction):
+        rdoc = rref.get(transaction=transaction, **READ)
+        if not rdoc.exists:
+            raise HTTPException(404)
+        r = rdoc.to_dict()
+        aref = db.collection('assignments').document(r['assignmentId'])
+        adoc = aref.get(transaction=transaction, **READ)
+        if not adoc.exists:
+            raise HTTPException(404)
+        a = adoc.to_dict()
+        new_end = date.fromisoformat(a['dateEnd']) + timedelta(days=int(r['extraDays']))
+        a_updates = {'dateEnd': new_end.isoformat(), 'state': 'in_progress'}
+        transaction.update(aref, a_updates)
+        transaction.update(rref, {'status': 'approved'})
+        transaction.set(
+            db.collection('notifications').document(),
+            {'type': 'extend_approved', 'assignmentId': aref.id, 'requestId': rid},
+        )
+        counters.apply(
+            transaction,
+            counters.combine(
+                counters.request_delta(r, {**r, 'status': 'approved'}),
+                counters.assignment_delta(a, {**a, **a_updates}),
+            ),
+        )
+        return aref.id, a_updates
+
+    aid, a_updates = write(db.transaction())
+    hooks.emit('requests', 'update', rid, {'status': 'approved'})
+    hooks.emit('assignments', 'update', aid, a_updates)
+    log.info("request.approved", extra=kv(id=rid, assignmentId=aid, dateEnd=a_updates['dateEnd']))
     return {"ok": True}
 
 @router.post("/{rid}/reject", dependencies=[Depends(require_role('admin'))])
-async def reject(rid: str):
+def reject(rid: str, response: Response, if_match: Optional[str] = Header(None)):
     rref = db.collection('requests').document(rid)
-    if not rref.get().exists:
-        raise HTTPException(404)
-    rref.update({'status':'rejected'})
-    return {"ok": True}
+
+    # прежний статус нужен счётчикам: читаем только его, пишем с предусловием по версии
+    def write(batch, r: dict, option):
+        batch.update(rref, {'status': 'rejected'}, option=option)
+        counters.apply(batch, counters.request_delta(r, {**r, 'status': 'rejected'}))
+
+    _, version = preconditions.conditional_write(rref, ['status'], write, if_match, "Request not found")
+    hooks.emit('requests', 'update', rid, {'status': 'rejected'})
+    log.info("request.rejected", extra=kv(id=rid))
+    preconditions.set_etag(response, version)
+    return {"ok": True, "version": version}
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional, Literal
+from ..auth import require_role
+from ..search import index
+from ..logs import get_logger, kv
+
+router = APIRouter(prefix="/search", tags=["search"])
+log = get_logger(__name__)
+
+Kind = Literal["project", "worker", "assignment"]
+
+
+@router.get("/", dependencies=[Depends(require_role("admin", "manager", "installer", "worker"))])
+def search(
+    q: str = Query(..., min_length=1),
+    type: Optional[list[Kind]] = Query(None, description="Ограничить типы результатов"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Поиск по проектам, монтажникам и назначениям"""
+    index.ensure_built()
+    results = index.search(q, kinds=set(type) if type else None, limit=limit)
+    log.debug("search", extra=kv(sampled=True, q=q, hits=len(results)))
+    return results
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Query, Header, Response
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from ..auth import require_role
 from ..firestore import db
+from ..projection import cache_key, parse_fields, select
+from ..resilience import READ, WRITE, read
+from .. import hooks, preconditions
+from ..logs import get_logger, kv
 
 router = APIRouter(prefix="/sections", tags=["sections"])
+log = get_logger(__name__)
 
 # =============================
 # 📘 МОДЕЛИ
@@ -30,10 +35,20 @@ class SectionUpdate(BaseModel):
 # =============================
 
 @router.get("/", dependencies=[Depends(require_role("admin","manager","worker","installer"))])
-def list_sections():
+def list_sections(
+    fields: Optional[str] = Query(None, description="Поля/пресеты через запятую: summary, dropdown"),
+):
     """Все разделы"""
-    docs = db.collection("sections").order_by("order").stream()
-    return [{"id": d.id, **(d.to_dict() or {})} for d in docs]
+    cols = parse_fields("sections", fields)
+
+    def fetch():
+        q = db.collection("sections").order_by("order")
+        return [
+            {"id": d.id, **(d.to_dict() or {}), "version": preconditions.version(d.update_time)}
+            for d in select(q, cols).stream(**READ)
+        ]
+
+    return read(("sections", cache_key(cols)), fetch)
 
 
 @router.post("/", dependencies=[Depends(require_role("admin","manager"))])
@@ -42,29 +57,40 @@ def create_section(payload: SectionCreate):
     ref = db.collection("sections").document()
     body = payload.model_dump()
     body["created_at"] = datetime.utcnow().isoformat()
-    ref.set(body)
-    return {"id": ref.id, **body}
+    version = preconditions.version(ref.set(body, **WRITE).update_time)
+    hooks.emit("sections", "set", ref.id, body)
+    log.info("section.created", extra=kv(id=ref.id))
+    return {"id": ref.id, **body, "version": version}
 
 
 @router.put("/{section_id}", dependencies=[Depends(require_role("admin","manager"))])
-def update_section(section_id: str, payload: SectionUpdate):
-    """Обновление раздела"""
+def update_section(
+    section_id: str,
+    payload: SectionUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    """Обновление раздела (If-Match: версия → 409, если раздел изменили)"""
     ref = db.collection("sections").document(section_id)
-    if not ref.get().exists:
-        raise HTTPException(404, "Section not found")
     updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
-    if updates:
+    if not updates:
+        version = preconditions.current(ref, if_match, "Section not found")
+    else:
         updates["updated_at"] = datetime.utcnow().isoformat()
-        ref.update(updates)
-    return {"ok": True}
+        version = preconditions.update(ref, updates, if_match, "Section not found")
+        hooks.emit("sections", "update", section_id, updates)
+        log.info("section.updated", extra=kv(id=section_id, fields=sorted(updates)))
+    preconditions.set_etag(response, version)
+    return {"ok": True, "version": version}
 
 
 @router.delete("/{section_id}", dependencies=[Depends(require_role("admin"))])
-def delete_section(section_id: str):
+def delete_section(section_id: str, if_match: Optional[str] = Header(None)):
     """Удаление раздела"""
     ref = db.collection("sections").document(section_id)
-    if ref.get().exists:
-        ref.delete()
+    if preconditions.delete(ref, if_match):
+        hooks.emit("sections", "delete", section_id)
+        log.info("section.deleted", extra=kv(id=section_id))
     return {"ok": True}
 
 
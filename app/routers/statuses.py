@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, Response
 from pydantic import BaseModel
 from typing import Optional
 from ..auth import require_role
 from ..firestore import db
+from .. import hooks, preconditions
+from ..resilience import READ, WRITE, read
 from datetime import datetime
+from ..logs import get_logger, kv
 
 router = APIRouter(prefix="/statuses", tags=["statuses"])
+log = get_logger(__name__)
 
 # ======================
 # 📘 МОДЕЛИ
@@ -30,12 +34,16 @@ class StatusUpdate(BaseModel):
 @router.get("/", dependencies=[Depends(require_role("admin", "manager", "worker", "installer"))])
 def list_statuses():
     """Список статусов. Если коллекция пуста — автоинициализация базовых."""
-    docs_ref = db.collection("statuses").order_by("order").stream()
-    docs = [{"id": d.id, **(d.to_dict() or {})} for d in docs_ref]
+    return read(("statuses",), _load_statuses)
+
+
+def _load_statuses():
+    docs_ref = db.collection("statuses").order_by("order").stream(**READ)
+    docs = [{"id": d.id, **(d.to_dict() or {}), "version": preconditions.version(d.update_time)} for d in docs_ref]
 
     # если пусто — создаём базовые статусы
     if not docs:
-        print("🧩 Коллекция statuses пуста. Создаю базовые статусы...")
+        log.info("statuses.seeding")
         base = [
             {"name": "Подготовка", "color": "#9999ff", "order": 1},
             {"name": "Монтаж", "color": "#00aa00", "order": 2},
@@ -43,10 +51,12 @@ def list_statuses():
         ]
         created = []
         for s in base:
-            ref = db.collection("statuses").document()
+            # id = имя, как в create_status: повтор чтения не создаст дубликатов
+            ref = db.collection("statuses").document(s["name"])
             s["created_at"] = datetime.utcnow().isoformat()
-            ref.set(s)
-            created.append({"id": ref.id, **s})
+            version = preconditions.version(ref.set(s, **WRITE).update_time)
+            hooks.emit("statuses", "set", ref.id, s)
+            created.append({"id": ref.id, **s, "version": version})
         return created
 
     return docs
@@ -58,27 +68,38 @@ def create_status(payload: StatusCreate):
     ref = db.collection("statuses").document(payload.name.strip())
     body = payload.model_dump()
     body["created_at"] = datetime.utcnow().isoformat()
-    ref.set(body)
+    ref.set(body, **WRITE)
+    hooks.emit("statuses", "set", ref.id, body)
+    log.info("status.created", extra=kv(id=ref.id))
     return {"id": ref.id, **body}
 
 
 @router.put("/{status_id}", dependencies=[Depends(require_role("admin", "manager"))])
-def update_status(status_id: str, payload: StatusUpdate):
-    """Редактирование статуса"""
+def update_status(
+    status_id: str,
+    payload: StatusUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    """Редактирование статуса (If-Match: версия → 409, если статус изменили)"""
     ref = db.collection("statuses").document(status_id)
-    if not ref.get().exists:
-        raise HTTPException(404, "Status not found")
     updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
-    if updates:
+    if not updates:
+        version = preconditions.current(ref, if_match, "Status not found")
+    else:
         updates["updated_at"] = datetime.utcnow().isoformat()
-        ref.update(updates)
-    return {"ok": True}
+        version = preconditions.update(ref, updates, if_match, "Status not found")
+        hooks.emit("statuses", "update", status_id, updates)
+        log.info("status.updated", extra=kv(id=status_id, fields=sorted(updates)))
+    preconditions.set_etag(response, version)
+    return {"ok": True, "version": version}
 
 
 @router.delete("/{status_id}", dependencies=[Depends(require_role("admin"))])
-def delete_status(status_id: str):
+def delete_status(status_id: str, if_match: Optional[str] = Header(None)):
     """Удаление статуса"""
     ref = db.collection("statuses").document(status_id)
-    if ref.get().exists:
-        ref.delete()
+    if preconditions.delete(ref, if_match):
+        hooks.emit("statuses", "delete", status_id)
+        log.info("status.deleted", extra=kv(id=status_id))
     return {"ok": True}
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import Literal, Optional
 from ..auth import require_role
 from ..firestore import db
+from .. import hooks
+from ..resilience import WRITE
+from ..logs import get_logger, kv
+from ..projection import parse_fields, select
 from datetime import datetime
 from firebase_admin import auth as fb_auth
-import secrets, string
+import secrets, string, csv, io, hashlib
 
 router = APIRouter(prefix="/users", tags=["users"])
+log = get_logger(__name__)
 
 Role = Literal["admin", "manager", "worker", "installer", "brigadier"]
 
+IMPORT_CHUNK = 1000        # максимум для fb_auth.import_users
+AUTH_LOOKUP_CHUNK = 100    # максимум для fb_auth.get_users
+FIRESTORE_BATCH = 500      # максимум записей в одном batch
+IMPORT_MAX_ROWS = 10000
+PBKDF2_ROUNDS = 10000
+
 class UserCreate(BaseModel):
     username: EmailStr
     full_name: str
@@ -18,6 +29,10 @@ class UserCreate(BaseModel):
     subrole: Optional[str] = None
     password: Optional[str] = None
 
+class UserImportRow(UserCreate):
+    phone: Optional[str] = None
+    type: Optional[str] = None
+
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     role: Optional[Role] = None
@@ -29,11 +44,14 @@ def _generate_password(length: int = 12) -> str:
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 @router.get("/", dependencies=[Depends(require_role("admin", "manager"))])
-def list_users(role: Optional[Role] = Query(None)):
+def list_users(
+    role: Optional[Role] = Query(None),
+    fields: Optional[str] = Query(None, description="Поля/пресеты через запятую: summary, dropdown"),
+):
     q = db.collection("users")
     if role:
         q = q.where("role", "==", role)
-    docs = q.stream()
+    docs = select(q, parse_fields("users", fields)).stream()
     return [{"id": d.id, **(d.to_dict() or {})} for d in docs]
 
 @router.post("/create-full", dependencies=[Depends(require_role("admin"))])
@@ -49,13 +67,198 @@ def create_full_user(payload: UserCreate):
     except fb_auth.EmailAlreadyExistsError:
         raise HTTPException(409, "Email already exists in Firebase")
 
-    ref.set({
+    data = {
         "username": email,
         "full_name": payload.full_name,
         "role": payload.role,
         "subrole": payload.subrole,
         "firebase_uid": fb_user.uid,
         "created_at": datetime.utcnow().isoformat(),
-    })
+    }
+    ref.set(data, **WRITE)
+    hooks.emit("users", "set", email, data)
+    log.info("user.created", extra=kv(id=email, role=payload.role))
 
     return {"id": email, "firebase_uid": fb_user.uid, "temp_password": temp_password}
+
+
+# =============================
+# 📥 Массовый импорт из CSV
+# =============================
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _read_csv(raw: bytes) -> list[dict]:
+    text = raw.decode("utf-8-sig")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    return [{(k or "").strip().lower(): (v or "").strip() for k, v in row.items()} for row in reader]
+
+def _hash_password(password: str) -> tuple[bytes, bytes]:
+    salt = secrets.token_bytes(16)
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PBKDF2_ROUNDS), salt
+
+def _user_doc(row: UserImportRow, email: str, uid: str) -> dict:
+    data = {
+        "username": email,
+        "full_name": row.full_name,
+        "role": row.role,
+        "subrole": row.subrole,
+        "firebase_uid": uid,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    # монтажникам — те же поля, что и в /workers/
+    if row.role == "installer":
+        data.update({
+            "email": email,
+            "phone": row.phone,
+            "type": row.type or "installer",
+            "active": True,
+        })
+    return data
+
+@router.post("/import", dependencies=[Depends(require_role("admin"))])
+def import_users(
+    file: UploadFile = File(...),
+    default_role: Optional[Role] = Query(None, description="Роль для строк без колонки role"),
+):
+    """
+    Импорт пользователей из CSV (username|email, full_name, role, subrole, password, phone, type).
+    Firebase — import_users пачками по 1000, Firestore — get_all + batch.
+    Возвращает отчёт по каждой строке.
+    """
+    try:
+        raw_rows = _read_csv(file.file.read())
+    except UnicodeDecodeError:
+        raise HTTPException(400, "Файл должен быть в UTF-8")
+    if len(raw_rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(400, f"Не больше {IMPORT_MAX_ROWS} строк за раз")
+
+    report: list[dict] = []
+    pending: list[dict] = []
+    seen: set[str] = set()
+
+    # 1) Валидация строк (номер строки — как в файле, с учётом заголовка)
+    for n, r in enumerate(raw_rows, start=2):
+        email = (r.get("username") or r.get("email") or "").lower()
+        try:
+            row = UserImportRow(
+                username=email,
+                full_name=r.get("full_name") or "",
+                role=r.get("role") or default_role,
+                subrole=r.get("subrole") or None,
+                password=r.get("password") or None,
+                phone=r.get("phone") or None,
+                type=r.get("type") or None,
+            )
+        except ValidationError as e:
+            err = e.errors()[0]
+            report.append({"row": n, "email": email, "status": "error",
+                           "detail": f"{'.'.join(map(str, err['loc']))}: {err['msg']}"})
+            continue
+        if not row.full_name.strip():
+            report.append({"row": n, "email": email, "status": "error", "detail": "full_name: пусто"})
+            continue
+        if email in seen:
+            report.append({"row": n, "email": email, "status": "error", "detail": "Дубликат в файле"})
+            continue
+        seen.add(email)
+        pending.append({"row": n, "email": email, "data": row})
+
+    # 2) Кто уже есть в Firestore — одним get_all на пачку; в Firebase Auth — get_users
+    #    (import_users уникальность email не проверяет и создал бы дубликат)
+    existing: set[str] = set()
+    for chunk in _chunks(pending, IMPORT_CHUNK):
+        refs = [db.collection("users").document(p["email"]) for p in chunk]
+        existing.update(s.id for s in db.get_all(refs) if s.exists)
+    for chunk in _chunks([p for p in pending if p["email"] not in existing], AUTH_LOOKUP_CHUNK):
+        found = fb_auth.get_users([fb_auth.EmailIdentifier(p["email"]) for p in chunk])
+        existing.update((u.email or "").lower() for u in found.users)
+    fresh = []
+    for p in pending:
+        if p["email"] in existing:
+            report.append({"row": p["row"], "email": p["email"], "status": "exists"})
+        else:
+            fresh.append(p)
+
+    # 3) Firebase Auth — import_users пачками
+    hash_alg = fb_auth.UserImportHash.pbkdf2_sha256(rounds=PBKDF2_ROUNDS)
+    imported = []
+    for chunk in _chunks(fresh, IMPORT_CHUNK):
+        records = []
+        for p in chunk:
+            row: UserImportRow = p["data"]
+            p["uid"] = secrets.token_urlsafe(21)
+            if not row.password:
+                p["temp_password"] = _generate_password()
+            pw_hash, salt = _hash_password(row.password or p["temp_password"])
+            records.append(fb_auth.ImportUserRecord(
+                uid=p["uid"],
+                email=p["email"],
+                display_name=row.full_name,
+                password_hash=pw_hash,
+                password_salt=salt,
+            ))
+        try:
+            result = fb_auth.import_users(records, hash_alg=hash_alg)
+        except Exception as e:
+            for p in chunk:
+                report.append({"row": p["row"], "email": p["email"], "status": "error",
+                               "detail": f"Firebase error: {e}"})
+            continue
+        failed = {err.index: err.reason for err in result.errors}
+        for i, p in enumerate(chunk):
+            if i in failed:
+                report.append({"row": p["row"], "email": p["email"], "status": "error",
+                               "detail": f"Firebase error: {failed[i]}"})
+            else:
+                imported.append(p)
+
+    # 4) Firestore — batch по 500 записей
+    for chunk in _chunks(imported, FIRESTORE_BATCH):
+        batch = db.batch()
+        docs = []
+        for p in chunk:
+            data = _user_doc(p["data"], p["email"], p["uid"])
+            batch.set(db.collection("users").document(p["email"]), data)
+            docs.append((p, data))
+        try:
+            batch.commit(**WRITE)
+        except Exception as e:
+            # без документа в Firestore аккаунт в Auth — сирота: удаляем, чтобы повторный импорт прошёл
+            uids = [p["uid"] for p, _ in docs]
+            try:
+                result = fb_auth.delete_users(uids)
+                orphans = {uids[err.index] for err in result.errors}
+            except Exception:
+                orphans = set(uids)
+            if orphans:
+                log.error("users.import.orphans", extra=kv(uids=sorted(orphans)))
+            for p, _ in docs:
+                item = {"row": p["row"], "email": p["email"], "status": "error",
+                        "detail": f"Firestore error: {e}"}
+                if p["uid"] in orphans:
+                    item["firebase_uid"] = p["uid"]
+                report.append(item)
+            continue
+        for p, data in docs:
+            hooks.emit("users", "set", p["email"], data)
+            item = {"row": p["row"], "email": p["email"], "status": "created", "firebase_uid": p["uid"]}
+            if "temp_password" in p:
+                item["temp_password"] = p["temp_password"]
+            report.append(item)
+
+    report.sort(key=lambda x: x["row"])
+    summary = {
+        "total": len(raw_rows),
+        "created": sum(1 for x in report if x["status"] == "created"),
+        "exists": sum(1 for x in report if x["status"] == "exists"),
+        "errors": sum(1 for x in report if x["status"] == "error"),
+    }
+    log.info("users.imported", extra=kv(**summary))
+    return {**summary, "rows": report}
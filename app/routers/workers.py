@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from ..auth import require_role
 from ..firestore import db
+from .. import hooks, preconditions
+from ..resilience import READ, WRITE, read
+from ..logs import get_logger, kv
+from ..projection import cache_key, parse_fields, select
+from ..availability import index as availability, day_index, mask_days
 
 router = APIRouter(prefix="/workers", tags=["workers"])
+log = get_logger(__name__)
 
 
 # === МОДЕЛИ ===
@@ -35,17 +41,71 @@ class WorkerUpdate(BaseModel):
 # === РОУТЫ ===
 
 @router.get("/", dependencies=[Depends(require_role("admin", "manager", "worker", "installer"))])
-def list_workers():
+def list_workers(
+    fields: Optional[str] = Query(None, description="Поля/пресеты через запятую: summary, dropdown"),
+):
     """Получить всех монтажников и бригадиров"""
-    # Берём пользователей с ролью installer (монтажники)
-    docs = db.collection("users").where("role", "==", "installer").stream()
-    result = []
-    for d in docs:
-        data = d.to_dict() or {}
-        # Гарантируем наличие поля type (installer/foreman)
-        data.setdefault("type", "installer")
-        result.append({"id": d.id, **data})
-    return result
+    cols = parse_fields("workers", fields)
+
+    def fetch():
+        # Берём пользователей с ролью installer (монтажники)
+        docs = select(db.collection("users").where("role", "==", "installer"), cols).stream(**READ)
+        result = []
+        for d in docs:
+            data = d.to_dict() or {}
+            # Гарантируем наличие поля type (installer/foreman)
+            if cols is None or "type" in cols:
+                data.setdefault("type", "installer")
+            result.append({"id": d.id, **data, "version": preconditions.version(d.update_time)})
+        return result
+
+    return read(("users", "workers", cache_key(cols)), fetch)
+
+
+@router.get("/available", dependencies=[Depends(require_role("admin", "manager"))])
+def available_workers(
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    type: Optional[str] = Query(None, description="installer или foreman"),
+):
+    """Кто свободен в диапазоне дат: полностью и частично, по возрастанию нагрузки"""
+    start, end = day_index(date_from), day_index(date_to)
+    if start is None or end is None:
+        raise HTTPException(400, "Неверный формат дат (YYYY-MM-DD)")
+    if end < start:
+        raise HTTPException(400, "Дата окончания раньше даты начала")
+    if end - start > 366:
+        raise HTTPException(400, "Диапазон не больше года")
+
+    availability.ensure_built()
+    total = end - start + 1
+
+    free, partial = [], []
+    for w in list_workers(fields="summary"):
+        if type and w.get("type") != type:
+            continue
+        busy = availability.busy(w["id"], start, end)
+        busy_days = busy.bit_count()
+        if busy_days == total:
+            continue
+        item = {
+            "id": w["id"],
+            "full_name": w.get("full_name", ""),
+            "type": w.get("type"),
+            "phone": w.get("phone"),
+            "free_days": total - busy_days,
+            "busy_days": busy_days,
+            "load_days": availability.load(w["id"], start, end),
+        }
+        if busy_days:
+            item["busy_dates"] = mask_days(busy)
+            partial.append(item)
+        else:
+            free.append(item)
+
+    free.sort(key=lambda x: (x["load_days"], x["full_name"]))
+    partial.sort(key=lambda x: (x["busy_days"], x["load_days"], x["full_name"]))
+    return {"from": date_from, "to": date_to, "days": total, "free": free, "partial": partial}
 
 
 @router.post("/", dependencies=[Depends(require_role("admin", "manager"))])
@@ -68,31 +128,39 @@ def create_worker(payload: WorkerCreate):
         "created_at": datetime.utcnow().isoformat(),
     }
 
-    ref.set(data)
+    ref.set(data, **WRITE)
+    hooks.emit("users", "set", email, data)
+    log.info("worker.created", extra=kv(id=email, type=data["type"]))
     return {"id": email, "role": "installer", "type": data["type"]}
 
 
 @router.put("/{worker_id}", dependencies=[Depends(require_role("admin", "manager"))])
-def update_worker(worker_id: str, payload: WorkerUpdate):
-    """Обновить данные монтажника"""
+def update_worker(
+    worker_id: str,
+    payload: WorkerUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    """Обновить данные монтажника (If-Match: версия → 409, если данные изменили)"""
     worker_id = worker_id.strip().lower()
     ref = db.collection("users").document(worker_id)
 
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Worker not found")
-
     updates = {k: v for k, v in payload.model_dump(exclude_none=True).items()}
     updates["updated_at"] = datetime.utcnow().isoformat()
 
-    ref.update(updates)
-    return {"ok": True, "updated_fields": list(updates.keys())}
+    version = preconditions.update(ref, updates, if_match, "Worker not found")
+    hooks.emit("users", "update", worker_id, updates)
+    log.info("worker.updated", extra=kv(id=worker_id, fields=sorted(updates)))
+    preconditions.set_etag(response, version)
+    return {"ok": True, "updated_fields": list(updates.keys()), "version": version}
 
 
 @router.delete("/{worker_id}", dependencies=[Depends(require_role("admin", "manager"))])
-def delete_worker(worker_id: str):
+def delete_worker(worker_id: str, if_match: Optional[str] = Header(None)):
     """Удалить монтажника"""
     worker_id = worker_id.strip().lower()
     ref = db.collection("users").document(worker_id)
-    if ref.get().exists:
-        ref.delete()
+    if preconditions.delete(ref, if_match):
+        hooks.emit("users", "delete", worker_id)
+        log.info("worker.deleted", extra=kv(id=worker_id))
     return {"ok": True}
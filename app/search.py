@@ -0,0 +1,253 @@
+"""
+Поиск в памяти по проектам, монтажникам и назначениям.
+
+Текст полей режется на токены (casefold + ё→е), для токенов строятся
+триграммный индекс (нечёткий поиск по подстроке) и отсортированный
+список (поиск по префиксу для коротких запросов).
+
+Индекс строится при старте приложения и обновляется хуками записи.
+"""
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from . import hooks
+from .firestore import db
+
+# Какие поля индексируем и с каким весом
+FIELDS = {
+    "project": {"name": 3, "address": 2, "city": 1, "notes": 1},
+    "worker": {"full_name": 3, "phone": 2, "email": 2},
+    "assignment": {"comments": 1, "sectionName": 1, "statusName": 1},
+}
+# Что ещё храним ради заголовков в выдаче
+EXTRA = {
+    "project": ("active",),
+    "worker": ("role", "type"),
+    "assignment": ("projectId", "dateStart", "dateEnd"),
+}
+MIN_TRIGRAM_RATIO = 0.6
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return text.casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = _TOKEN_RE.findall(normalize(text))
+    digits = "".join(ch for ch in text if ch.isdigit())
+    # телефон ищем и по цифрам целиком, без скобок и дефисов
+    if len(digits) >= 5 and digits not in tokens:
+        tokens.append(digits)
+    return tokens
+
+
+def trigrams(token: str) -> set[str]:
+    t = f"^{token}$"
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._ready = False
+        self._docs: dict[tuple[str, str], dict] = {}
+        self._terms: dict[tuple[str, str], dict[str, int]] = {}
+        self._postings: dict[str, set[tuple[str, str]]] = defaultdict(set)
+        self._grams: dict[str, set[str]] = defaultdict(set)
+        self._sorted: list[str] = []
+        self._bulk = False  # идёт загрузка: _sorted собираем один раз в конце
+        self._backlog: Optional[list[tuple]] = None  # хуки, пришедшие во время построения
+
+    # ---------- построение ----------
+
+    def rebuild(self, docs: Iterable[tuple[str, str, dict]]) -> None:
+        """
+        Индекс строится в отдельном объекте без блокировки (docs может быть
+        потоком из Firestore), под _lock только подменяются структуры —
+        запись, дёргающая on_write, не ждёт чтения всей базы.
+        """
+        fresh = SearchIndex()
+        fresh._load(docs)
+        with self._lock:
+            self._docs, self._terms = fresh._docs, fresh._terms
+            self._postings, self._grams, self._sorted = fresh._postings, fresh._grams, fresh._sorted
+            # записи во время построения могли не попасть в поток — применяем поверх
+            for event in self._backlog or ():
+                self._apply(*event)
+            self._backlog = None
+            self._ready = True
+
+    def _load(self, docs: Iterable[tuple[str, str, dict]]) -> None:
+        # insort на каждый новый токен — O(n²) на всей базе; сортируем один раз
+        self._bulk = True
+        try:
+            for kind, doc_id, data in docs:
+                self._put(kind, doc_id, data)
+        finally:
+            self._bulk = False
+            self._sorted = sorted(self._postings)
+
+    def ensure_built(self) -> None:
+        if self._ready:
+            return
+        with self._build_lock:
+            if self._ready:
+                return
+            with self._lock:
+                self._backlog = []
+            try:
+                self.rebuild(_load_all())
+            finally:
+                with self._lock:
+                    self._backlog = None
+
+    # ---------- инкрементальные изменения ----------
+
+    def _add_token(self, token: str, key: tuple[str, str]) -> None:
+        if token not in self._postings:
+            if not self._bulk:
+                bisect.insort(self._sorted, token)
+            for g in trigrams(token):
+                self._grams[g].add(token)
+        self._postings[token].add(key)
+
+    def _drop_token(self, token: str, key: tuple[str, str]) -> None:
+        keys = self._postings.get(token)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._postings[token]
+            if not self._bulk:
+                i = bisect.bisect_left(self._sorted, token)
+                if i < len(self._sorted) and self._sorted[i] == token:
+                    del self._sorted[i]
+            for g in trigrams(token):
+                self._grams[g].discard(token)
+                if not self._grams[g]:
+                    del self._grams[g]
+
+    def _remove(self, key: tuple[str, str]) -> None:
+        for token in self._terms.pop(key, {}):
+            self._drop_token(token, key)
+        self._docs.pop(key, None)
+
+    def _put(self, kind: str, doc_id: str, data: dict) -> None:
+        key = (kind, doc_id)
+        self._remove(key)
+        if kind == "worker" and data.get("role") != "installer":
+            return
+        keep = {f: data.get(f) for f in (*FIELDS[kind], *EXTRA[kind]) if data.get(f) is not None}
+        terms: dict[str, int] = {}
+        for field, weight in FIELDS[kind].items():
+            for token in tokenize(str(keep.get(field) or "")):
+                terms[token] = max(terms.get(token, 0), weight)
+        self._docs[key] = keep
+        self._terms[key] = terms
+        for token in terms:
+            self._add_token(token, key)
+
+    def on_write(self, kind: str, op: str, doc_id: str, data: Optional[dict]) -> None:
+        with self._lock:
+            if self._backlog is not None:
+                self._backlog.append((kind, op, doc_id, data))
+            elif self._ready:
+                self._apply(kind, op, doc_id, data)
+
+    def _apply(self, kind: str, op: str, doc_id: str, data: Optional[dict]) -> None:
+        key = (kind, doc_id)
+        if op == "delete":
+            self._remove(key)
+        elif op == "update":
+            if key in self._docs or kind != "worker":
+                self._put(kind, doc_id, {**self._docs.get(key, {}), **(data or {})})
+        else:
+            self._put(kind, doc_id, data or {})
+
+    # ---------- поиск ----------
+
+    def _match(self, qt: str) -> dict[str, float]:
+        """Токены индекса, подходящие под токен запроса, с оценкой 0..1"""
+        out: dict[str, float] = {}
+        # префикс
+        i = bisect.bisect_left(self._sorted, qt)
+        while i < len(self._sorted) and self._sorted[i].startswith(qt):
+            t = self._sorted[i]
+            out[t] = 1.0 if t == qt else 0.9
+            i += 1
+        if len(qt) < 3:
+            return out
+        # подстрока / опечатки — по доле общих триграмм
+        qgrams = trigrams(qt)
+        counts: dict[str, int] = defaultdict(int)
+        for g in qgrams:
+            for t in self._grams.get(g, ()):
+                counts[t] += 1
+        for t, c in counts.items():
+            ratio = c / len(qgrams)
+            if ratio >= MIN_TRIGRAM_RATIO and t not in out:
+                out[t] = 0.8 * ratio
+        return out
+
+    def search(self, q: str, kinds: Optional[set[str]] = None, limit: int = 20) -> list[dict]:
+        q_tokens = list(dict.fromkeys(_TOKEN_RE.findall(normalize(q))))
+        if not q_tokens:
+            return []
+        with self._lock:
+            scores: Optional[dict[tuple[str, str], float]] = None
+            for qt in q_tokens:
+                hit: dict[tuple[str, str], float] = {}
+                for token, quality in self._match(qt).items():
+                    for key in self._postings.get(token, ()):
+                        s = quality * self._terms[key][token]
+                        if s > hit.get(key, 0):
+                            hit[key] = s
+                # все слова запроса должны найтись
+                if scores is None:
+                    scores = hit
+                else:
+                    scores = {k: scores[k] + s for k, s in hit.items() if k in scores}
+                if not scores:
+                    return []
+
+            ranked = heapq.nlargest(
+                limit,
+                (k for k in scores if not kinds or k[0] in kinds),
+                key=scores.__getitem__,
+            )
+            return [self._result(k, scores[k]) for k in ranked]
+
+    def _result(self, key: tuple[str, str], score: float) -> dict:
+        kind, doc_id = key
+        d = self._docs[key]
+        if kind == "project":
+            title, subtitle = d.get("name", ""), d.get("address") or d.get("city") or ""
+        elif kind == "worker":
+            title, subtitle = d.get("full_name", ""), d.get("phone") or d.get("email") or ""
+        else:
+            title = d.get("comments") or d.get("sectionName") or ""
+            subtitle = f"{d.get('dateStart', '')} – {d.get('dateEnd', '')}"
+        return {"type": kind, "id": doc_id, "title": title, "subtitle": subtitle,
+                "score": round(score, 3), **{f: d[f] for f in EXTRA[kind] if f in d}}
+
+
+def _load_all():
+    for d in db.collection("projects").stream():
+        yield "project", d.id, d.to_dict() or {}
+    for d in db.collection("users").where("role", "==", "installer").stream():
+        yield "worker", d.id, d.to_dict() or {}
+    for d in db.collection("assignments").stream():
+        yield "assignment", d.id, d.to_dict() or {}
+
+
+index = SearchIndex()
+hooks.subscribe("projects", lambda op, i, data: index.on_write("project", op, i, data))
+hooks.subscribe("users", lambda op, i, data: index.on_write("worker", op, i, data))
+hooks.subscribe("assignments", lambda op, i, data: index.on_write("assignment", op, i, data))
@@ -0,0 +1,97 @@
+"""
+Склейка одинаковых одновременных чтений (single-flight) + микрокэш.
+
+Если несколько запросов одновременно просят одно и то же (ключ — кортеж,
+первый элемент которого — имя коллекции), в Firestore уходит один запрос,
+остальные ждут и получают тот же результат. Результат общий —
+вызывающий код не должен его изменять.
+
+Кэш и незавершённые запросы коллекции сбрасываются хуками записи.
+"""
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+from . import hooks
+from .config import settings
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "generation")
+
+    def __init__(self, generation: int):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.generation = generation
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = 0.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._calls: dict[tuple, _Call] = {}
+        self._cache: dict[tuple, tuple[float, Any]] = {}
+        self._generations: dict[Hashable, int] = {}
+        self._stats = {"executed": 0, "collapsed": 0, "cache_hits": 0}
+
+    def do(self, key: tuple, fn: Callable[[], Any]) -> Any:
+        collection = key[0]
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self._stats["cache_hits"] += 1
+                return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(self._generations.get(collection, 0))
+                self._calls[key] = call
+                self._stats["executed"] += 1
+            else:
+                self._stats["collapsed"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                fresh = call.generation == self._generations.get(collection, 0)
+                if call.error is None and self.ttl > 0 and fresh:
+                    self._cache[key] = (time.monotonic() + self.ttl, call.result)
+            call.event.set()
+        return call.result
+
+    def invalidate(self, collection: str) -> None:
+        """После записи: новые запросы не должны получить данные до неё"""
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            for key in [k for k in self._cache if k[0] == collection]:
+                del self._cache[key]
+            for key in [k for k in self._calls if k[0] == collection]:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["in_flight"] = len(self._calls)
+            s["cached"] = len(self._cache)
+        total = s["executed"] + s["collapsed"] + s["cache_hits"]
+        s["saved_ratio"] = round((total - s["executed"]) / total, 3) if total else 0.0
+        return s
+
+
+flight = SingleFlight(ttl=settings.READ_CACHE_TTL)
+
+for _collection in ("assignments", "projects", "statuses", "sections", "users"):
+    hooks.subscribe(_collection, lambda op, doc_id, data, c=_collection: flight.invalidate(c))
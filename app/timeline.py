@@ -0,0 +1,202 @@
+"""
+Таймлайн проекта (диаграмма Ганта).
+
+Назначения проекта сливаются в непересекающиеся отрезки по разделу
+и статусу (объединение интервалов), считаются покрытие плановых сроков
+и отставание плана/факта от договора.
+
+Результат кэшируется по проекту и сбрасывается хуками записи
+в assignments и projects.
+"""
+import threading
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from . import hooks, recurrence
+from .firestore import db
+from .queries import iter_assignments
+
+# Если у проекта нет ни плановых, ни договорных сроков, бесконечные серии режем этим горизонтом
+OPEN_SERIES_HORIZON_DAYS = 365
+
+
+def _d(s: Optional[str]) -> Optional[date]:
+    if not s:
+        return None
+    try:
+        return date.fromisoformat(str(s)[:10])
+    except ValueError:
+        return None
+
+
+def merge(intervals: Iterable[tuple[date, date]]) -> list[tuple[date, date]]:
+    """Объединение интервалов [start, end]; соседние дни склеиваются"""
+    out: list[tuple[date, date]] = []
+    for s, e in sorted(intervals):
+        if out and s <= out[-1][1] + timedelta(days=1):
+            if e > out[-1][1]:
+                out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+
+def _days(spans: list[tuple[date, date]]) -> int:
+    return sum((e - s).days + 1 for s, e in spans)
+
+
+def _clip(spans: list[tuple[date, date]], lo: date, hi: date) -> list[tuple[date, date]]:
+    return [(max(s, lo), min(e, hi)) for s, e in spans if s <= hi and e >= lo]
+
+
+def _coverage(spans: list[tuple[date, date]], lo: Optional[date], hi: Optional[date]) -> Optional[float]:
+    """Доля плановых дней, на которые есть назначения (%)"""
+    if not lo or not hi or hi < lo:
+        return None
+    return round(100 * _days(_clip(spans, lo, hi)) / ((hi - lo).days + 1), 1)
+
+
+def _out(spans: list[tuple[date, date]]) -> list[dict]:
+    return [{"start": s.isoformat(), "end": e.isoformat(), "days": (e - s).days + 1} for s, e in spans]
+
+
+def _diff(a: Optional[date], b: Optional[date]) -> Optional[int]:
+    """На сколько дней a позже b (отрицательное — раньше)"""
+    return (a - b).days if a and b else None
+
+
+def compute(project_id: str, project: dict) -> tuple[dict, set[str]]:
+    """Таймлайн и id назначений, из которых он собран"""
+    planned_start, planned_end = _d(project.get("start_date")), _d(project.get("end_date"))
+    contract_start, contract_end = _d(project.get("contract_start")), _d(project.get("contract_end"))
+
+    # Окно для разворота повторяющихся серий — весь известный срок проекта
+    bounds = [x for x in (planned_start, planned_end, contract_start, contract_end) if x]
+    docs = list(iter_assignments(project_id=project_id))
+    for x in docs:
+        if not x.get("recurrence"):
+            bounds += [b for b in (_d(x.get("dateStart")), _d(x.get("dateEnd"))) if b]
+    today = date.today()
+    lo = min(bounds, default=today)
+    hi = max(bounds, default=today)
+    if not (planned_end or contract_end):
+        hi = max(hi, today + timedelta(days=OPEN_SERIES_HORIZON_DAYS))
+
+    def items():
+        for x in docs:
+            if recurrence.is_recurring(x):
+                yield from recurrence.occurrence_docs(x, lo.isoformat(), hi.isoformat())
+            else:
+                yield x
+
+    by_status: dict[tuple, list[tuple[date, date]]] = {}
+    section_names: dict[Optional[str], str] = {}
+    status_names: dict[tuple, str] = {}
+    for x in items():
+        s = _d(x.get("dateStart"))
+        e = _d(x.get("dateEnd")) or s
+        if not s or e < s:
+            continue
+        sid = x.get("sectionId")
+        key = (sid, x.get("statusId"))
+        section_names.setdefault(sid, x.get("sectionName") or "Без раздела")
+        status_names.setdefault(key, x.get("statusName") or "")
+        by_status.setdefault(key, []).append((s, e))
+
+    sections = []
+    all_spans: list[tuple[date, date]] = []
+    for sid, sname in section_names.items():
+        statuses = []
+        sec_intervals: list[tuple[date, date]] = []
+        for (ssid, st_id), intervals in by_status.items():
+            if ssid != sid:
+                continue
+            spans = merge(intervals)
+            sec_intervals += spans
+            statuses.append({
+                "statusId": st_id,
+                "statusName": status_names[(ssid, st_id)],
+                "spans": _out(spans),
+                "days": _days(spans),
+            })
+        sec_spans = merge(sec_intervals)
+        all_spans += sec_spans
+        statuses.sort(key=lambda x: x["spans"][0]["start"])
+        sections.append({
+            "sectionId": sid,
+            "sectionName": sname,
+            "spans": _out(sec_spans),
+            "days": _days(sec_spans),
+            "coverage_pct": _coverage(sec_spans, planned_start, planned_end),
+            "statuses": statuses,
+        })
+    sections.sort(key=lambda x: x["spans"][0]["start"] if x["spans"] else "")
+
+    total = merge(all_spans)
+    actual_start = total[0][0] if total else None
+    actual_end = total[-1][1] if total else None
+
+    result = {
+        "project_id": project_id,
+        "name": project.get("name"),
+        "planned": {"start": project.get("start_date"), "end": project.get("end_date")},
+        "contract": {"start": project.get("contract_start"), "end": project.get("contract_end")},
+        "actual": {
+            "start": actual_start.isoformat() if actual_start else None,
+            "end": actual_end.isoformat() if actual_end else None,
+        },
+        "slippage_days": {
+            "planned_start_vs_contract": _diff(planned_start, contract_start),
+            "planned_end_vs_contract": _diff(planned_end, contract_end),
+            "actual_start_vs_planned": _diff(actual_start, planned_start),
+            "actual_end_vs_planned": _diff(actual_end, planned_end),
+            "actual_end_vs_contract": _diff(actual_end, contract_end),
+        },
+        "spans": _out(total),
+        "coverage_pct": _coverage(total, planned_start, planned_end),
+        "sections": sections,
+    }
+    return result, {x["id"] for x in docs}
+
+
+class TimelineCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: dict[str, dict] = {}
+        self._owner: dict[str, str] = {}  # assignment_id → project_id закэшированных таймлайнов
+        self._generation: dict[str, int] = {}
+
+    def get(self, project_id: str) -> Optional[dict]:
+        cached = self._items.get(project_id)
+        if cached is not None:
+            return cached
+        generation = self._generation.get(project_id, 0)
+        snap = db.collection("projects").document(project_id).get()
+        if not snap.exists:
+            return None
+        result, ids = compute(project_id, snap.to_dict() or {})
+        with self._lock:
+            # пока считали, была запись — результат отдаём, но не кэшируем
+            if self._generation.get(project_id, 0) != generation:
+                return result
+            self._items[project_id] = result
+            for aid in ids:
+                self._owner[aid] = project_id
+        return result
+
+    def invalidate(self, project_id: Optional[str]) -> None:
+        if not project_id:
+            return
+        with self._lock:
+            self._items.pop(project_id, None)
+            self._generation[project_id] = self._generation.get(project_id, 0) + 1
+
+    def on_assignment(self, op: str, aid: str, data: Optional[dict]) -> None:
+        # назначение могло переехать в другой проект — сбрасываем оба
+        self.invalidate(self._owner.get(aid))
+        self.invalidate((data or {}).get("projectId"))
+
+
+cache = TimelineCache()
+hooks.subscribe("assignments", cache.on_assignment)
+hooks.subscribe("projects", lambda op, project_id, data: cache.invalidate(project_id))
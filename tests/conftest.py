@@ -0,0 +1,10 @@
+"""
+Тесты чистых модулей (рекурренция, индексы, логи, предохранитель).
+
+app.firestore создаёт клиент при импорте. Адрес эмулятора позволяет
+создать его без учётных данных; сети тесты не трогают.
+"""
+import os
+
+os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "localhost:8080")
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test")
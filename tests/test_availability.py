@@ -0,0 +1,87 @@
+from app.availability import AvailabilityIndex, day_index, day_str, mask_days, range_mask
+
+
+def test_day_index_roundtrip():
+    i = day_index("2024-02-29T10:00:00")
+    assert day_str(i) == "2024-02-29"
+    assert day_index("не дата") is None and day_index(None) is None
+
+
+def test_range_mask():
+    assert range_mask(2, 4) == 0b11100
+    assert range_mask(-3, 1) == 0b11  # дни до BASE отбрасываются
+    assert range_mask(5, 4) == 0
+
+
+def test_mask_days():
+    start = day_index("2024-01-30")
+    assert mask_days(range_mask(start, start + 2)) == ["2024-01-30", "2024-01-31", "2024-02-01"]
+
+
+def _busy(idx: AvailabilityIndex, worker: str, a: str, b: str) -> list[str]:
+    return mask_days(idx.busy(worker, day_index(a), day_index(b)))
+
+
+def test_busy_merges_assignments_and_series():
+    idx = AvailabilityIndex()
+    idx.rebuild([
+        ("a1", {"workerIds": ["w1"], "dateStart": "2024-03-04", "dateEnd": "2024-03-05"}),
+        ("a2", {"workerIds": ["w1", "w2"], "dateStart": "2024-03-07"}),
+        ("s1", {"workerIds": ["w2"], "dateStart": "2024-03-01", "dateEnd": "2024-03-01",
+                "recurrence": {"freq": "weekly", "byweekday": [4]}, "exdates": ["2024-03-08"]}),
+    ])
+    assert _busy(idx, "w1", "2024-03-01", "2024-03-10") == ["2024-03-04", "2024-03-05", "2024-03-07"]
+    assert _busy(idx, "w2", "2024-03-01", "2024-03-20") == ["2024-03-01", "2024-03-07", "2024-03-15"]
+    assert _busy(idx, "w3", "2024-03-01", "2024-03-20") == []
+
+
+def test_on_write_updates_and_deletes():
+    idx = AvailabilityIndex()
+    idx.rebuild([("a1", {"workerIds": ["w1"], "dateStart": "2024-03-04"})])
+
+    # перенос на другого работника и другую дату
+    idx.on_write("update", "a1", {"workerIds": ["w2"], "dateStart": "2024-03-06"})
+    assert _busy(idx, "w1", "2024-03-01", "2024-03-10") == []
+    assert _busy(idx, "w2", "2024-03-01", "2024-03-10") == ["2024-03-06"]
+
+    # снятие повтора: поля серии приходят как None
+    idx.on_write("set", "s1", {"workerIds": ["w2"], "dateStart": "2024-03-01",
+                               "recurrence": {"freq": "daily", "count": 3}})
+    assert _busy(idx, "w2", "2024-03-01", "2024-03-10") == ["2024-03-01", "2024-03-02", "2024-03-03", "2024-03-06"]
+    idx.on_write("update", "s1", {"recurrence": None, "exdates": None, "seriesEnd": None})
+    assert _busy(idx, "w2", "2024-03-01", "2024-03-10") == ["2024-03-01", "2024-03-06"]
+
+    idx.on_write("delete", "a1", None)
+    assert _busy(idx, "w2", "2024-03-01", "2024-03-10") == ["2024-03-01"]
+
+
+def test_load_counts_days_around_range():
+    idx = AvailabilityIndex()
+    idx.rebuild([("a1", {"workerIds": ["w1"], "dateStart": "2024-03-01", "dateEnd": "2024-03-10"})])
+    d = day_index("2024-04-05")
+    assert idx.load("w1", d, d) == 5  # окно ±30 дней задевает 6–10 марта
+
+
+def test_writes_during_build_do_not_block_and_are_replayed(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+    from app import availability
+
+    idx = AvailabilityIndex()
+    done = []
+
+    def stream():
+        yield SimpleNamespace(id="a1", to_dict=lambda: {"workerIds": ["w1"], "dateStart": "2024-03-04"})
+        t = threading.Thread(target=lambda: (
+            idx.on_write("set", "a2", {"workerIds": ["w1"], "dateStart": "2024-03-06"}),
+            idx.on_write("delete", "a1", None),
+            done.append(True),
+        ))
+        t.start()
+        t.join(5)
+        assert done, "on_write ждал построения индекса"
+
+    fake_db = SimpleNamespace(collection=lambda name: SimpleNamespace(stream=stream))
+    monkeypatch.setattr(availability, "db", fake_db)
+    idx.ensure_built()
+    assert _busy(idx, "w1", "2024-03-01", "2024-03-10") == ["2024-03-06"]
@@ -0,0 +1,51 @@
+import pytest
+
+from app.logs import redact
+
+
+def test_secret_keys_are_hidden():
+    out = redact({"password": "p@ss", "idToken": "abc", "Authorization": "Bearer x", "name": "Иван"})
+    assert out == {"password": "***", "idToken": "***", "Authorization": "***", "name": "Иван"}
+
+
+def test_email_keeps_first_letter_and_domain():
+    assert redact("от ivan.petrov@mail.ru") == "от i***@mail.ru"
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("+7 (912) 345-67-89", "+* (***) ***-**-89"),
+    ("89123456789", "*********89"),
+    (79123456789, "*********89"),
+])
+def test_phone_fields_keep_last_two_digits(value, expected):
+    assert redact({"phone": value}) == {"phone": expected}
+    assert redact({"workerMobile": value}) == {"workerMobile": expected}
+
+
+def test_phone_in_free_text_is_masked():
+    out = redact("звонить +7 912 345 67 89")
+    assert out.endswith("89")
+    assert "912" not in out and "345" not in out
+
+
+@pytest.mark.parametrize("value", [
+    "2025-03-15",
+    "2025-03-15T10:20:30.123456",
+    "период 2025-03-01 – 2025-03-31",
+    "заказ 20250315-0042",
+])
+def test_dates_and_ids_are_left_alone(value):
+    assert redact(value) == value
+    assert redact({"dateStart": value}) == {"dateStart": value}
+
+
+def test_nested_structures():
+    out = redact({"payload": {"workers": [{"phone": "+79123456789", "email": "a.b@c.ru"}], "days": 3}})
+    assert out == {"payload": {"workers": [{"phone": "+*********89", "email": "a***@c.ru"}], "days": 3}}
+
+
+def test_names_keep_initials_only():
+    out = redact({"full_name": "Пётр Иванов", "workerNames": ["Анна Смирнова", "Олег"],
+                  "display_name": "Ivan", "sectionName": "Секция 2", "name": "ЖК Солнечный"})
+    assert out == {"full_name": "П*** И***", "workerNames": ["А*** С***", "О***"],
+                   "display_name": "I***", "sectionName": "Секция 2", "name": "ЖК Солнечный"}
@@ -0,0 +1,34 @@
+import pytest
+from fastapi import HTTPException
+
+from app.projection import cache_key, parse_fields, trim
+from app.singleflight import SingleFlight
+
+
+def test_parse_fields_presets_and_id():
+    assert parse_fields("projects", None) is None
+    assert parse_fields("projects", "dropdown,active") == ["active", "name"]
+    assert parse_fields("projects", "id") == []
+
+
+def test_parse_fields_rejects_bad_names():
+    with pytest.raises(HTTPException) as e:
+        parse_fields("projects", "name;drop")
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("fields", [None, "id", "summary", "name,id"])
+def test_cache_key_is_hashable(fields):
+    cols = parse_fields("projects", fields)
+    key = ("projects", cache_key(cols))
+    assert SingleFlight().do(key, lambda: "ok") == "ok"
+
+
+def test_cache_key_separates_all_fields_from_id_only():
+    assert cache_key(None) != cache_key(parse_fields("projects", "id"))
+
+
+def test_trim_keeps_id_for_empty_projection():
+    item = {"id": "p1", "name": "Склад", "version": "v", "active": True}
+    assert trim(item, []) == {"id": "p1", "version": "v"}
+    assert trim(item, None) is item
@@ -0,0 +1,111 @@
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from app import recurrence
+
+
+def brute_starts(doc: dict, horizon: date) -> list[date]:
+    """Даты начала вхождений перебором по дням — эталон для арифметики"""
+    rule = doc["recurrence"]
+    first = date.fromisoformat(doc["dateStart"])
+    interval = rule.get("interval", 1)
+    until = date.fromisoformat(rule["until"]) if rule.get("until") else horizon
+    count = rule.get("count")
+    days = set(rule.get("byweekday") or [first.weekday()])
+    week0 = first - timedelta(days=first.weekday())
+    out = []
+    d = first
+    while d <= until and (count is None or len(out) < count):
+        if rule.get("freq") == "daily":
+            hit = (d - first).days % interval == 0
+        else:
+            hit = d.weekday() in days and (d - week0).days // 7 % interval == 0
+        if hit:
+            out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+RULES = [
+    {"freq": "daily"},
+    {"freq": "daily", "interval": 3, "count": 10},
+    {"freq": "daily", "until": "2024-03-01"},
+    {"freq": "weekly"},
+    {"freq": "weekly", "byweekday": [0, 2, 4], "count": 7},
+    {"freq": "weekly", "interval": 2, "byweekday": [1, 6], "until": "2024-05-01"},
+    {"freq": "weekly", "interval": 3, "byweekday": [0], "count": 5},
+    {"freq": "weekly", "byweekday": [5, 6], "until": "2024-04-10", "count": 4},
+]
+
+
+@pytest.mark.parametrize("rule", RULES)
+@pytest.mark.parametrize("start", ["2024-01-03", "2024-01-07"])  # среда, воскресенье
+def test_expand_matches_brute_force(rule, start):
+    doc = {"dateStart": start, "dateEnd": start, "recurrence": rule}
+    horizon = date(2024, 6, 30)
+    expected = brute_starts(doc, horizon)
+    for lo, hi in [("2024-01-01", "2024-06-30"), ("2024-02-10", "2024-02-20"), ("2024-03-05", "2024-04-25")]:
+        got = [s for s, _ in recurrence.expand(doc, lo, hi)]
+        assert got == [d for d in expected if lo <= d.isoformat() <= hi]
+
+
+def test_expand_keeps_duration_and_skips_exdates():
+    doc = {
+        "dateStart": "2024-01-01",
+        "dateEnd": "2024-01-02",
+        "recurrence": {"freq": "weekly", "count": 4},
+        "exdates": ["2024-01-08"],
+    }
+    got = list(recurrence.expand(doc, "2023-12-01", "2024-02-01"))
+    assert got == [
+        (date(2024, 1, 1), date(2024, 1, 2)),
+        (date(2024, 1, 15), date(2024, 1, 16)),
+        (date(2024, 1, 22), date(2024, 1, 23)),
+    ]
+
+
+def test_expand_includes_occurrence_overlapping_window_start():
+    doc = {"dateStart": "2024-01-01", "dateEnd": "2024-01-03", "recurrence": {"freq": "weekly"}}
+    got = list(recurrence.expand(doc, "2024-01-09", "2024-01-09"))
+    assert got == [(date(2024, 1, 8), date(2024, 1, 10))]
+
+
+def test_overlap_days_clips_to_window():
+    doc = {"dateStart": "2024-01-01", "dateEnd": "2024-01-03", "recurrence": {"freq": "weekly", "count": 3}}
+    assert recurrence.overlap_days(doc, "2024-01-02", "2024-01-15") == 2 + 3 + 1
+
+
+@pytest.mark.parametrize("rule", [r for r in RULES if r.get("until") or r.get("count")])
+@pytest.mark.parametrize("start", ["2024-01-03", "2024-01-07"])
+def test_series_end_matches_brute_force(rule, start):
+    doc = {"dateStart": start, "dateEnd": (date.fromisoformat(start) + timedelta(days=1)).isoformat(),
+           "recurrence": rule}
+    expected = brute_starts(doc, date(2030, 1, 1))
+    assert recurrence.series_end(doc) == (expected[-1] + timedelta(days=1)).isoformat()
+
+
+def test_series_end_open_series():
+    doc = {"dateStart": "2024-01-01", "recurrence": {"freq": "daily"}}
+    assert recurrence.series_end(doc) == recurrence.OPEN_END
+
+
+def test_series_end_without_occurrences_falls_back_to_first():
+    # понедельник раньше первого дня, а until — до следующего понедельника: вхождений нет
+    doc = {"dateStart": "2024-01-03", "dateEnd": "2024-01-04",
+           "recurrence": {"freq": "weekly", "byweekday": [0], "until": "2024-01-05"}}
+    assert recurrence.series_end(doc) == "2024-01-04"
+
+
+@pytest.mark.parametrize("rule", [
+    {"freq": "daily", "until": "9999-12-31"},
+    {"freq": "weekly", "byweekday": [0, 6], "interval": 3, "until": "9999-12-31"},
+    {"freq": "weekly", "byweekday": [0, 6], "count": 1000},
+])
+def test_series_end_is_arithmetic(rule):
+    doc = {"dateStart": "2024-01-01", "dateEnd": "2024-01-02", "recurrence": rule}
+    t = time.perf_counter()
+    end = recurrence.series_end(doc)
+    assert time.perf_counter() - t < 0.05
+    assert date.fromisoformat(end) > date(2024, 1, 1)
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import replica as replica_mod
+from app.replica import Replica
+
+
+def doc(doc_id: str, **data):
+    return SimpleNamespace(id=doc_id, to_dict=lambda: data)
+
+
+def change(kind: str, d):
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=d)
+
+
+class FakeWatch:
+    _closed = False
+
+
+class FakeDb:
+    """Вместо Firestore: запоминает колбэки on_snapshot по коллекциям"""
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def collection(self, name):
+        def on_snapshot(cb):
+            self.callbacks[name] = cb
+            return FakeWatch()
+        return SimpleNamespace(on_snapshot=on_snapshot)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    fake = FakeDb()
+    monkeypatch.setattr(replica_mod, "db", fake)
+    r = Replica(str(tmp_path / "replica.sqlite3"), max_lag=5)
+    r.start()
+    return r, fake
+
+
+def ids(r: Replica) -> list[str]:
+    return [x["id"] for x in r.assignments()]
+
+
+A1 = doc("a1", dateStart="2024-03-01", workerIds=["w1"], projectId="p1")
+A2 = doc("a2", dateStart="2024-03-02", workerIds=["w2"], projectId="p1")
+
+
+def test_changes_are_applied(env):
+    r, fake = env
+    fake.callbacks["assignments"]([A1, A2], [change("ADDED", A1), change("ADDED", A2)], None)
+    fake.callbacks["users"]([], [], None)
+    assert r.fresh()
+    assert ids(r) == ["a1", "a2"]
+    fake.callbacks["assignments"]([A1], [change("REMOVED", A2)], None)
+    assert ids(r) == ["a1"]
+    assert [x["id"] for x in r.assignments(worker_uid="w1")] == ["a1"]
+
+
+def test_resubscribe_drops_documents_deleted_while_down(env):
+    r, fake = env
+    fake.callbacks["assignments"]([A1, A2], [change("ADDED", A1), change("ADDED", A2)], None)
+    fake.callbacks["users"]([], [], None)
+
+    # listener упал, a2 тем временем удалили; новый listener присылает только то, что есть
+    r.expect("assignments", "a2")
+    r._watches["assignments"]._closed = True
+    assert not r.fresh()
+    fake.callbacks["assignments"]([A1], [change("ADDED", A1)], None)
+
+    assert r.fresh() and r.stats()["pending"] == 0
+    assert ids(r) == ["a1"]
+    assert list(r.assignments(worker_uid="w2")) == []
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from google.api_core import exceptions as gexc
+
+from app import resilience
+from app.resilience import CircuitBreaker
+
+
+def test_breaker_opens_after_threshold():
+    b = CircuitBreaker(threshold=3, reset_seconds=60)
+    for _ in range(2):
+        b.failure()
+    assert b.state == "closed" and b.allow()
+    b.failure()
+    assert b.state == "open"
+    assert not b.allow()
+    assert b.snapshot()["opened"] == 1 and b.snapshot()["rejected"] == 1
+
+
+def test_success_resets_failure_count():
+    b = CircuitBreaker(threshold=2, reset_seconds=60)
+    b.failure()
+    b.success()
+    b.failure()
+    assert b.state == "closed"
+
+
+def test_half_open_lets_one_probe_through():
+    b = CircuitBreaker(threshold=1, reset_seconds=0.01)
+    b.failure()
+    time.sleep(0.02)
+    assert b.state == "half_open"
+    assert b.allow()
+    assert not b.allow()
+    b.success()
+    assert b.state == "closed" and b.allow()
+
+
+def test_failed_probe_reopens():
+    b = CircuitBreaker(threshold=5, reset_seconds=0.01)
+    for _ in range(5):
+        b.failure()
+    time.sleep(0.02)
+    assert b.allow()
+    b.failure()
+    assert b.state == "open"
+    assert b.snapshot()["opened"] == 2
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    """Свой предохранитель и пустой кэш устаревших данных, без пауз между повторами"""
+    monkeypatch.setattr(resilience, "breaker", CircuitBreaker(threshold=1, reset_seconds=60))
+    monkeypatch.setattr(resilience, "_stale", {})
+    monkeypatch.setattr(resilience.settings, "FIRESTORE_RETRY_BASE", 0)
+
+
+def test_read_retries_transient_errors(fresh):
+    errors = [gexc.ServiceUnavailable("x")]
+
+    def fn():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert resilience.read(("test", "retry"), fn) == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_read_serves_stale_value_when_breaker_open(fresh):
+    key = ("test", "stale")
+    assert resilience.read(key, lambda: "v1") == "v1"
+    resilience.breaker.failure()
+
+    state = resilience.begin_request()
+    assert resilience.read(key, lambda: pytest.fail("Firestore не должен вызываться")) == "v1"
+    assert state["stale_age"] is not None
+
+
+def test_read_without_stale_fails_closed(fresh):
+    key = ("test", "auth")
+    assert resilience.read(key, lambda: "v1", stale=False) == "v1"
+    resilience.breaker.failure()
+    with pytest.raises(HTTPException) as e:
+        resilience.read(key, lambda: "v2", stale=False)
+    assert e.value.status_code == 503
@@ -0,0 +1,115 @@
+from app.search import SearchIndex, normalize, tokenize, trigrams
+
+DOCS = [
+    ("project", "p1", {"name": "ЖК Солнечный", "address": "ул. Ленина, 5", "active": True}),
+    ("project", "p2", {"name": "Офис Ёлка", "city": "Казань"}),
+    ("worker", "w1", {"full_name": "Пётр Иванов", "phone": "+7 (912) 345-67-89", "role": "installer"}),
+    ("worker", "m1", {"full_name": "Мария Иванова", "role": "manager"}),
+    ("assignment", "a1", {"comments": "монтаж окон", "sectionName": "Секция 2", "projectId": "p1",
+                          "dateStart": "2024-03-01", "dateEnd": "2024-03-02"}),
+]
+
+
+def built() -> SearchIndex:
+    idx = SearchIndex()
+    idx.rebuild(DOCS)
+    return idx
+
+
+def ids(results: list[dict]) -> list[str]:
+    return [r["id"] for r in results]
+
+
+def test_normalize_and_tokenize():
+    assert normalize("ЁЛКА") == "елка"
+    assert tokenize("+7 (912) 345-67-89") == ["7", "912", "345", "67", "89", "79123456789"]
+    assert trigrams("ab") == {"^ab", "ab$"}
+
+
+def test_rebuild_keeps_sorted_unique_tokens():
+    idx = built()
+    assert idx._sorted == sorted(set(idx._sorted))
+    assert set(idx._sorted) == set(idx._postings)
+
+
+def test_exact_prefix_and_fuzzy_matches():
+    idx = built()
+    assert ids(idx.search("солнечный")) == ["p1"]
+    assert ids(idx.search("солн")) == ["p1"]
+    assert ids(idx.search("сонечный")) == ["p1"]  # опечатка — по триграммам
+    assert ids(idx.search("елка")) == ["p2"]
+    assert ids(idx.search("79123456789")) == ["w1"]
+
+
+def test_all_query_words_must_match_and_weights_rank():
+    idx = built()
+    assert ids(idx.search("иванов петр")) == ["w1"]
+    assert ids(idx.search("иванов монтаж")) == []
+    # название (вес 3) выше адреса (вес 2)
+    idx.rebuild(DOCS + [("project", "p3", {"name": "Склад", "address": "Солнечный проезд"})])
+    assert ids(idx.search("солнечный")) == ["p1", "p3"]
+
+
+def test_non_installers_are_not_indexed():
+    assert ids(built().search("мария")) == []
+
+
+def test_kinds_filter_and_result_shape():
+    idx = built()
+    res = idx.search("окон", kinds={"assignment"})
+    assert res == [{"type": "assignment", "id": "a1", "title": "монтаж окон",
+                    "subtitle": "2024-03-01 – 2024-03-02", "score": 1.0, "projectId": "p1",
+                    "dateStart": "2024-03-01", "dateEnd": "2024-03-02"}]
+    assert idx.search("окон", kinds={"project"}) == []
+
+
+def test_incremental_writes_match_full_rebuild():
+    idx = built()
+    idx.on_write("project", "update", "p1", {"name": "ЖК Лунный"})
+    idx.on_write("project", "delete", "p2", None)
+    idx.on_write("worker", "set", "w2", {"full_name": "Олег Сидоров", "role": "installer"})
+
+    fresh = SearchIndex()
+    fresh.rebuild([
+        ("project", "p1", {"name": "ЖК Лунный", "address": "ул. Ленина, 5", "active": True}),
+        DOCS[2], DOCS[3], DOCS[4],
+        ("worker", "w2", {"full_name": "Олег Сидоров", "role": "installer"}),
+    ])
+    assert idx._sorted == fresh._sorted
+    assert dict(idx._postings) == dict(fresh._postings)
+    assert ids(idx.search("солнечный")) == []
+    assert ids(idx.search("лунный")) == ["p1"]
+
+
+def test_writes_before_first_build_are_ignored():
+    idx = SearchIndex()
+    idx.on_write("project", "set", "p1", {"name": "Склад"})
+    assert idx._sorted == [] and not idx._docs
+
+
+def test_writes_during_build_do_not_block_and_are_replayed(monkeypatch):
+    import threading
+    from app import search as search_mod
+
+    idx = SearchIndex()
+    done = []
+
+    def load_all():
+        yield DOCS[0]
+        # запись во время чтения базы не должна ждать конца построения
+        t = threading.Thread(target=lambda: (
+            idx.on_write("project", "set", "p9", {"name": "Новый склад"}),
+            idx.on_write("project", "delete", "p1", None),
+            done.append(True),
+        ))
+        t.start()
+        t.join(5)
+        assert done, "on_write ждал построения индекса"
+        yield DOCS[1]
+
+    monkeypatch.setattr(search_mod, "_load_all", load_all)
+    idx.ensure_built()
+    assert ids(idx.search("склад")) == ["p9"]
+    assert ids(idx.search("солнечный")) == []
+    assert ids(idx.search("елка")) == ["p2"]
+    assert idx._backlog is None
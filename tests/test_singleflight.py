@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    sf = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [1, 2, 3]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(sf.do(("assignments", "x"), fn)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(sf.do(("assignments", "x"), fn))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    # ждём, пока все ведомые встанут в очередь за ведущим
+    deadline = time.monotonic() + 5
+    while sf.stats()["collapsed"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == [[1, 2, 3]] * 6
+    assert sf.stats()["executed"] == 1 and sf.stats()["collapsed"] == 5
+
+
+def test_error_is_shared_and_not_cached():
+    sf = SingleFlight(ttl=60)
+
+    def boom():
+        raise ValueError("нет")
+
+    with pytest.raises(ValueError):
+        sf.do(("projects",), boom)
+    assert sf.do(("projects",), lambda: "ok") == "ok"
+
+
+def test_ttl_cache_and_invalidation():
+    sf = SingleFlight(ttl=60)
+    n = iter(range(100))
+    key = ("statuses",)
+    assert sf.do(key, lambda: next(n)) == 0
+    assert sf.do(key, lambda: next(n)) == 0
+    assert sf.stats()["cache_hits"] == 1
+    sf.invalidate("statuses")
+    assert sf.do(key, lambda: next(n)) == 1
+    # сброс другой коллекции кэш не трогает
+    sf.invalidate("projects")
+    assert sf.do(key, lambda: next(n)) == 1
+
+
+def test_result_started_before_write_is_not_cached():
+    sf = SingleFlight(ttl=60)
+    key = ("assignments",)
+
+    def stale_read():
+        sf.invalidate("assignments")  # запись пришла, пока читали
+        return "old"
+
+    assert sf.do(key, stale_read) == "old"
+    assert sf.do(key, lambda: "new") == "new"